@@ -0,0 +1,84 @@
+# 品牌比對效能測試：以模擬文章比較原本的 iterrows + str.count 做法與 brand_matcher 的單次掃描
+# 用法：python brand_benchmark.py --rows 100000 --baseline-rows 5000
+
+import argparse
+import random
+import time
+from collections import Counter
+
+import pandas as pd
+
+import brand_matcher
+from brand_matcher import BRAND_MAP, BrandMatcher
+from ddcar_fixture_server import BRAND_WORDS, FILLER, MODEL_WORDS
+
+EXTRA_WORDS = ["MGM 影城", "VWX 平台", "Nokia 手機", "Mercedes-Benz", "名爵", "富豪", "ＭＧ４", "BMW iX"]
+
+
+def synthetic_articles(n, seed=0):
+    rng = random.Random(seed)
+    words = FILLER * 4 + BRAND_WORDS + MODEL_WORDS + EXTRA_WORDS
+    return ["，".join(rng.choices(words, k=rng.randint(40, 120))) + "。" for _ in range(n)]
+
+
+# 原本 ddcar_ev_news_with_brands.py 的做法
+def baseline(df):
+    df = df.copy()
+    df["提及的電動車品牌"] = ""
+    for brand in BRAND_MAP:
+        df[brand] = 0
+    for idx, row in df.iterrows():
+        content = str(row["新聞內文"]).lower()
+        mentioned_brands = []
+        for brand, aliases in BRAND_MAP.items():
+            count = sum(content.count(alias.lower()) for alias in aliases)
+            if count > 0:
+                mentioned_brands.append(brand)
+                df.at[idx, brand] = count
+        df.at[idx, "提及的電動車品牌"] = "、".join(mentioned_brands)
+    return df
+
+
+def vectorized(df, matcher):
+    df = df.copy()
+    counts = matcher.count_matrix(df["新聞內文"].tolist())
+    df["提及的電動車品牌"] = matcher.mentioned(counts)
+    df[matcher.brands] = pd.DataFrame(counts, columns=matcher.brands, index=df.index)
+    return df
+
+
+def report(name, rows, chars, seconds):
+    print(f"{name:<28}{rows:>8} 篇{seconds:>9.2f} 秒{rows / seconds:>12.0f} 篇/秒{chars / seconds / 1e6:>8.2f} M 字/秒")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="品牌比對效能測試")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--baseline-rows", type=int, default=5000, help="原本做法太慢，只跑前 N 篇")
+    args = parser.parse_args()
+
+    texts = synthetic_articles(args.rows)
+    df = pd.DataFrame({"新聞內文": texts})
+    total_chars = sum(map(len, texts))
+    print(f"模擬文章 {args.rows} 篇，平均 {total_chars / args.rows:.0f} 字")
+
+    sample = df.head(args.baseline_rows)
+    sample_chars = sum(map(len, sample["新聞內文"]))
+    start = time.perf_counter()
+    base = baseline(sample)
+    report("原本（iterrows + count）", len(sample), sample_chars, time.perf_counter() - start)
+
+    implementations = [("pyahocorasick", brand_matcher.ahocorasick)] if brand_matcher.ahocorasick else []
+    implementations.append(("純 Python 自動機", None))
+    for name, module in implementations:
+        brand_matcher.ahocorasick = module
+        matcher = BrandMatcher()
+        start = time.perf_counter()
+        result = vectorized(df, matcher)
+        report(f"brand_matcher（{name}）", len(df), total_chars, time.perf_counter() - start)
+
+    # 與原本做法的差異來自最左最長與字界規則（例如 Mercedes-Benz 不再同時算成 Mercedes）
+    diff = Counter()
+    for brand in BRAND_MAP:
+        diff[brand] = int((result[brand].head(len(base)) != base[brand]).sum())
+    print("與原本做法計數不同的篇數：", {b: n for b, n in diff.items() if n})
@@ -0,0 +1,220 @@
+# 品牌提及比對：把所有品牌別名編成一個 Aho-Corasick 自動機，每篇文章只掃過一次
+# 重疊的別名取「最左、最長」的那一個（例如 Mercedes-Benz 不會同時算成 Mercedes），
+# 短的英文別名（MG、VW、Kia…）前面不能接英數字、後面不能接英文字母，避免 "MGM"、"VWX" 之類的誤判
+# （後面接數字仍算，例如車款 MG4）
+# 有安裝 pyahocorasick 時用它的 C 實作，否則用純 Python 版本
+
+import re
+import string
+from collections import deque
+
+import numpy as np
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# ddcar_ev_news_with_brands.py 使用的品牌對照表
+BRAND_MAP = {
+    "Tesla": ["Tesla", "特斯拉"],
+    "Nissan": ["Nissan", "日產"],
+    "Hyundai": ["Hyundai", "現代"],
+    "BYD": ["BYD", "比亞迪"],
+    "BMW": ["BMW", "BMW i"],
+    "Lexus": ["Lexus", "雷克薩斯"],
+    "Mercedes": ["Mercedes", "賓士", "Mercedes-Benz"],
+    "Volkswagen": ["Volkswagen", "福斯", "VW"],
+    "Audi": ["Audi", "奧迪"],
+    "Toyota": ["Toyota", "豐田"],
+    "Kia": ["Kia", "起亞"],
+    "Porsche": ["Porsche", "保時捷"],
+    "Mazda": ["Mazda", "馬自達"],
+    "Ford": ["Ford", "福特"],
+    "MG": ["MG", "名爵"],
+    "Volvo": ["Volvo", "富豪"],
+    "Peugeot": ["Peugeot", "標緻"],
+    "Renault": ["Renault", "雷諾"],
+    "Lucid": ["Lucid"],
+    "Rivian": ["Rivian"],
+    "Honda": ["Honda", "本田"]
+}
+
+# ddcar_related_terms.py 判斷「文章是否提到任何車廠」用的較寬對照表：BRAND_MAP 再加上沒有品牌欄位的車廠
+# 只用來決定文章要不要送 LLM，寧可多送也不漏（例如「長城」「理想」可能是一般詞彙，多送一篇的代價較小）
+EV_BRAND_MAP = BRAND_MAP | {
+    "Luxgen": ["Luxgen", "納智捷"],
+    "Foxtron": ["Foxtron", "鴻華先進"],
+    "Xpeng": ["Xpeng", "XPeng", "小鵬"],
+    "NIO": ["NIO", "蔚來"],
+    "Li Auto": ["Li Auto", "理想汽車", "理想 L"],
+    "Zeekr": ["Zeekr", "極氪"],
+    "Xiaomi": ["Xiaomi", "小米汽車", "小米 SU7"],
+    "Geely": ["Geely", "吉利汽車"],
+    "Great Wall": ["Great Wall", "長城汽車", "ORA", "歐拉"],
+    "Leapmotor": ["Leapmotor", "零跑"],
+    "Hongqi": ["Hongqi", "紅旗汽車"],
+    "Polestar": ["Polestar", "極星"],
+    "Lotus": ["Lotus", "蓮花"],
+    "Smart": ["smart #1", "smart #3", "smart 精靈"],
+    "Mini": ["MINI"],
+    "Jaguar": ["Jaguar", "捷豹"],
+    "Land Rover": ["Land Rover", "荒原路華", "Range Rover"],
+    "Cadillac": ["Cadillac", "凱迪拉克"],
+    "Chevrolet": ["Chevrolet", "雪佛蘭"],
+    "GMC": ["GMC", "Hummer"],
+    "Genesis": ["Genesis GV", "Genesis G80", "捷尼賽思"],
+    "Subaru": ["Subaru", "速霸陸"],
+    "Mitsubishi": ["Mitsubishi", "三菱"],
+    "Suzuki": ["Suzuki", "鈴木"],
+    "Skoda": ["Skoda", "Škoda"],
+    "Citroen": ["Citroen", "Citroën", "雪鐵龍"],
+    "DS": ["DS Automobiles", "DS 3", "DS 4", "DS 7"],
+    "Opel": ["Opel", "歐寶"],
+    "Fiat": ["Fiat", "飛雅特"],
+    "Jeep": ["Jeep"],
+    "Alfa Romeo": ["Alfa Romeo", "愛快羅密歐"],
+    "Infiniti": ["Infiniti"],
+    "Maserati": ["Maserati", "瑪莎拉蒂"],
+    "Ferrari": ["Ferrari", "法拉利"],
+    "Lamborghini": ["Lamborghini", "藍寶堅尼"],
+    "Bentley": ["Bentley", "賓利"],
+    "Rolls-Royce": ["Rolls-Royce", "勞斯萊斯"],
+    "Aston Martin": ["Aston Martin", "奧斯頓馬丁"],
+    "McLaren": ["McLaren", "麥拉倫"],
+    "Fisker": ["Fisker"],
+    "VinFast": ["VinFast"],
+    "Gogoro": ["Gogoro"],
+    "Kymco": ["Kymco", "光陽"],
+}
+
+# 爬蟲（ddcar_news_data_from_web.py）原本 brand_pattern 的 8 個品牌，欄位名稱沿用
+# 原本的正規表示式沒有字界限制（"BMW i" 也會比對到 "BMW iX"），建立時用 boundary_max_len=0 保持一致
+SCRAPER_BRAND_MAP = {
+    "Tesla": ["Tesla"],
+    "Hyundai": ["Hyundai"],
+    "BMW i": ["BMW i"],
+    "Lexus": ["Lexus"],
+    "Nissan": ["Nissan"],
+    "Toyota": ["Toyota"],
+    "Mercedes": ["Mercedes"],
+    "Porsche": ["Porsche"],
+}
+
+
+FULLWIDTH = re.compile("[０-９Ａ-Ｚａ-ｚ－　]+")
+FULLWIDTH_TABLE = {c: c - 0xFEE0 for c in range(0xFF01, 0xFF5F)} | {0x3000: 0x20}
+LETTERS = frozenset(string.ascii_lowercase)
+WORD_CHARS = LETTERS | frozenset(string.digits)
+
+
+def _normalize(text):
+    # 全形英數字轉成半形（只處理英數字，比整篇做 NFKC 快很多），之後統一小寫比對
+    text = str(text)
+    return FULLWIDTH.sub(lambda m: m.group().translate(FULLWIDTH_TABLE), text).lower()
+
+
+class _PyAutomaton:
+    """純 Python 的 Aho-Corasick：goto 用 dict，output 沿 fail 連結合併。"""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for word, value in words:
+            state = 0
+            for ch in word:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.output[state].append(value)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for value in output[state]:
+                yield i, value
+
+
+class BrandMatcher:
+    """brand_map 為 {品牌: [別名, ...]}。count(text) 回傳各品牌次數的陣列，順序同 self.brands。"""
+
+    def __init__(self, brand_map=BRAND_MAP, boundary_max_len=4):
+        self.brands = list(brand_map)
+        words = {}
+        for index, aliases in enumerate(brand_map.values()):
+            for alias in aliases:
+                key = _normalize(alias)
+                # 短的純英數別名要求前後是字界
+                needs_boundary = key.isascii() and len(key.replace(" ", "")) <= boundary_max_len
+                words[key] = (len(key), index, needs_boundary)
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for key, value in words.items():
+                self.automaton.add_word(key, value)
+            self.automaton.make_automaton()
+        else:
+            self.automaton = _PyAutomaton(words.items())
+
+    # 回傳 [(起點, 終點, 品牌 index), ...]，已處理字界與最左最長
+    def matches(self, text):
+        text = _normalize(text)
+        n = len(text)
+        candidates = []
+        for end, (length, index, needs_boundary) in self.automaton.iter(text):
+            start = end - length + 1
+            if needs_boundary:
+                if start and text[start - 1] in WORD_CHARS:
+                    continue
+                if end + 1 < n and text[end + 1] in LETTERS:
+                    continue
+            candidates.append((start, -length, index))
+        candidates.sort()
+        selected = []
+        last_end = -1
+        for start, neg_length, index in candidates:
+            if start > last_end:
+                selected.append((start, start - neg_length - 1, index))
+                last_end = start - neg_length - 1
+        return selected
+
+    def count(self, text):
+        counts = np.zeros(len(self.brands), dtype=np.int32)
+        for _, _, index in self.matches(text):
+            counts[index] += 1
+        return counts
+
+    def count_matrix(self, texts):
+        """一次處理多篇文章，回傳 (文章數, 品牌數) 的 int32 陣列。"""
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for _, _, index in self.matches(text):
+                rows.append(row)
+                cols.append(index)
+        counts = np.zeros((len(texts), len(self.brands)), dtype=np.int32)
+        np.add.at(counts, (rows, cols), 1)
+        return counts
+
+    # 依品牌順序列出有提及的品牌，例如 "Tesla、BMW"
+    def mentioned(self, counts, sep="、"):
+        counts = np.asarray(counts)
+        if counts.ndim == 1:
+            return sep.join(self.brands[i] for i in np.flatnonzero(counts))
+        return [sep.join(self.brands[i] for i in np.flatnonzero(row)) for row in counts]
@@ -0,0 +1,166 @@
+# 列表頁連結探索：捲動後等「a.title.my-2 的數量變多」而不是固定 sleep，等待上限依實際載入時間自動調整
+# 等待逾時不直接當成到底：再捲一次並以 max_timeout 等第二次，頁面高度與連結數都沒變才結束
+# 第一次捲動後從瀏覽器的 performance entries 找出網站載入下一頁用的 XHR，找到後直接用 HTTP 呼叫（依 HostThrottle 間隔），不再捲動
+# 每次載入後都收集連結，達到目標篇數、早於指定日期或 stop(links) 成立時提早結束
+
+import datetime
+import re
+import time
+from urllib.parse import urljoin
+
+import requests
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+from ddcar_fetch import HostThrottle
+
+LINK_SELECTOR = "a.title.my-2"
+DATE_PATTERN = re.compile(r"(\d{4})[/.-](\d{1,2})[/.-](\d{1,2})")
+ARTICLE_HREF = re.compile(r"""["'](/news/(?:view|detail)/\d+[^"'\s]*)""")
+PAGE_PARAM = re.compile(r"([?&](?:page|p|pageindex|pageno|page_no)=)(\d+)", re.IGNORECASE)
+PAGE_PATH = re.compile(r"(/)(\d+)(/?)(?=$|\?)")
+
+
+def _parse_date(text):
+    match = DATE_PATTERN.search(text or "")
+    if not match:
+        return None
+    try:
+        return datetime.date(*map(int, match.groups()))
+    except ValueError:
+        return None
+
+
+def harvest_items(html, base_url):
+    """從列表頁（或分頁 XHR 回傳的 HTML 片段）取出 [(連結, 日期或 None), ...]，依出現順序去重。"""
+    soup = BeautifulSoup(html, "html.parser")
+    items = {}
+    for a in soup.select(LINK_SELECTOR):
+        if not a.has_attr("href"):
+            continue
+        link = urljoin(base_url + "/", a["href"])
+        items.setdefault(link, _parse_date(a.parent.get_text(" ", strip=True)) if a.parent else None)
+    if not items:
+        # JSON 格式的分頁回應：直接找文章網址
+        for href in ARTICLE_HREF.findall(html):
+            items.setdefault(urljoin(base_url + "/", href.replace("\\/", "/")), None)
+    return list(items.items())
+
+
+# 從瀏覽器已送出的請求中找分頁 XHR，回傳 (網址樣板, 頁碼)；樣板中頁碼以 {page} 表示
+def detect_paging_xhr(driver):
+    entries = driver.execute_script(
+        "return performance.getEntriesByType('resource')"
+        ".filter(e => e.initiatorType === 'xmlhttprequest' || e.initiatorType === 'fetch').map(e => e.name)"
+    ) or []
+    for url in reversed(entries):
+        if "page" not in url.lower() and "list" not in url.lower():
+            continue
+        match = PAGE_PARAM.search(url) or PAGE_PATH.search(url)
+        if match:
+            template = url[:match.start(2)].replace("{", "{{").replace("}", "}}") + "{page}" + \
+                url[match.end(2):].replace("{", "{{").replace("}", "}}")
+            return template, int(match.group(2))
+    return None
+
+
+class LinkDiscovery:
+    def __init__(self, driver, base_url, scroll_limit=50, max_count=None, since=None, stop=None,
+                 initial_timeout=5.0, min_timeout=5.0, max_timeout=15.0, use_xhr=True, throttle=None):
+        self.driver = driver
+        self.base_url = base_url
+        self.scroll_limit = scroll_limit
+        self.max_count = max_count
+        self.since = since
+        self.stop = stop
+        self.timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.use_xhr = use_xhr
+        self.throttle = throttle or HostThrottle(per_host=1, delay=1.0)  # 分頁 XHR 的請求間隔
+        self.items = {}  # 連結 -> 日期
+
+    def _add(self, items):
+        before = len(self.items)
+        for link, date in items:
+            self.items.setdefault(link, date)
+        return len(self.items) - before
+
+    def _should_stop(self):
+        links = list(self.items)
+        if self.max_count and len(links) >= self.max_count:
+            print(f"已達目標篇數 {self.max_count}")
+            return True
+        if self.since and any(date and date < self.since for date in self.items.values()):
+            print(f"已出現早於 {self.since} 的文章")
+            return True
+        if self.stop and self.stop(links):
+            print("已遇到抓過的文章")
+            return True
+        return False
+
+    # 捲到底並等待連結數量增加或頁面變高
+    def _wait_for_more(self, count, height, timeout):
+        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.2).until(
+                lambda d: len(d.find_elements(By.CSS_SELECTOR, LINK_SELECTOR)) > count
+                or d.execute_script("return document.body.scrollHeight") > height
+            )
+        except TimeoutException:
+            return False
+        return True
+
+    # 等待上限取最近載入時間的 3 倍（限制在 min_timeout ~ max_timeout）；
+    # 逾時後再以 max_timeout 確認一次，避免慢的一頁讓探索提早結束
+    def _scroll_once(self):
+        count = len(self.driver.find_elements(By.CSS_SELECTOR, LINK_SELECTOR))
+        height = self.driver.execute_script("return document.body.scrollHeight")
+        start = time.perf_counter()
+        if not self._wait_for_more(count, height, self.timeout):
+            if not self._wait_for_more(count, height, self.max_timeout):
+                return False
+            print(f"載入超過 {self.timeout:.1f} 秒，第二次等待後才出現新內容")
+        elapsed = time.perf_counter() - start
+        self.timeout = min(self.max_timeout, max(self.min_timeout, 3 * elapsed))
+        return True
+
+    # 直接呼叫分頁 XHR，沿用瀏覽器的 cookie
+    def _follow_xhr(self, template, page, scrolls):
+        session = requests.Session()
+        session.headers.update({"User-Agent": self.driver.execute_script("return navigator.userAgent"),
+                                "X-Requested-With": "XMLHttpRequest"})
+        for cookie in self.driver.get_cookies():
+            session.cookies.set(cookie["name"], cookie["value"])
+        try:
+            while scrolls < self.scroll_limit and not self._should_stop():
+                page += 1
+                scrolls += 1
+                url = template.format(page=page)
+                with self.throttle(url):
+                    response = session.get(url, timeout=30)
+                if response.status_code != 200 or not self._add(harvest_items(response.text, self.base_url)):
+                    print(f"分頁 XHR 已無更多資料，共讀取到第 {page - 1} 頁")
+                    break
+        finally:
+            session.close()
+
+    def run(self, list_url):
+        self.driver.get(list_url)
+        self._add(harvest_items(self.driver.page_source, self.base_url))
+        for i in range(self.scroll_limit):
+            if self._should_stop():
+                break
+            if not self._scroll_once():
+                print(f"已滑到底，總共滑動 {i + 1} 次")
+                break
+            self._add(harvest_items(self.driver.page_source, self.base_url))
+            paging = detect_paging_xhr(self.driver) if self.use_xhr and i == 0 else None
+            if paging:
+                print(f"偵測到分頁 XHR：{paging[0]}，改為直接呼叫")
+                self._follow_xhr(paging[0], paging[1], i + 1)
+                break
+        links = [link for link, date in self.items.items() if not (self.since and date and date < self.since)]
+        return links[:self.max_count] if self.max_count else links
@@ -1,57 +1,123 @@
+# 品牌標記：分批讀入新聞 CSV，交給多個行程比對品牌，再依原順序逐批寫出（CSV 或 Parquet）
+# 同時在處理中的批次數有上限，記憶體用量與檔案大小無關
+# 用法：python ddcar_ev_news_with_brands.py [--input ddcar_ev_news.csv] [--output ddcar_ev_news_with_brand.csv]
+#       [--chunksize 5000] [--workers 4] [--format csv|parquet]
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-from collections import Counter
-import re
-
-# Step 1: 載入內文資料
-df = pd.read_csv("ddcar_ev_news.csv")
-
-# Step 2: 定義品牌對照表
-brand_map = {
-    "Tesla": ["Tesla", "特斯拉"],
-    "Nissan": ["Nissan", "日產"],
-    "Hyundai": ["Hyundai", "現代"],
-    "BYD": ["BYD", "比亞迪"],
-    "BMW": ["BMW", "BMW i"],
-    "Lexus": ["Lexus", "雷克薩斯"],
-    "Mercedes": ["Mercedes", "賓士", "Mercedes-Benz"],
-    "Volkswagen": ["Volkswagen", "福斯", "VW"],
-    "Audi": ["Audi", "奧迪"],
-    "Toyota": ["Toyota", "豐田"],
-    "Kia": ["Kia", "起亞"],
-    "Porsche": ["Porsche", "保時捷"],
-    "Mazda": ["Mazda", "馬自達"],
-    "Ford": ["Ford", "福特"],
-    "MG": ["MG", "名爵"],
-    "Volvo": ["Volvo", "富豪"],
-    "Peugeot": ["Peugeot", "標緻"],
-    "Renault": ["Renault", "雷諾"],
-    "Lucid": ["Lucid"],
-    "Rivian": ["Rivian"],
-    "Honda": ["Honda", "本田"]
-}
-
-# Step 3: 初始化欄位
-brand_names = list(brand_map.keys())
-df["提及的電動車品牌"] = ""
-
-for brand in brand_names:
-    df[brand] = 0  # 初始化每個品牌欄位
-
-# Step 4: 分析每一篇文章
-for idx, row in df.iterrows():
-    content = str(row["新聞內文"]).lower()
-    mention_counts = Counter()
-    mentioned_brands = []
-
-    for brand, aliases in brand_map.items():
-        count = sum(content.count(alias.lower()) for alias in aliases)
-        if count > 0:
-            mention_counts[brand] = count
-            mentioned_brands.append(brand)
-            df.at[idx, brand] = count
-
-    df.at[idx, "提及的電動車品牌"] = "、".join(mentioned_brands)
-
-# Step 5: 輸出結果
-df.to_csv("ddcar_ev_news_with_brand.csv", index=False, encoding="utf-8-sig")
-print("已輸出至 ddcar_ev_news_with_brand.csv")
+from brand_matcher import BrandMatcher, BRAND_MAP, SCRAPER_BRAND_MAP
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+_matcher = None
+
+# 輸出欄位型別：品牌次數欄（本程式與爬蟲寫入的）為 int32，其餘（id、標題、內文、連結…）一律為字串
+COUNT_COLUMNS = set(BRAND_MAP) | set(SCRAPER_BRAND_MAP)
+
+
+def output_schema(columns):
+    return pa.schema([(c, pa.int32() if c in COUNT_COLUMNS else pa.string()) for c in columns])
+
+
+def _init_worker():
+    global _matcher
+    _matcher = BrandMatcher(BRAND_MAP)
+
+
+# 子行程只收內文、回傳次數矩陣與提及品牌字串，減少行程間傳送的資料量
+def tag_texts(texts):
+    if _matcher is None:
+        _init_worker()
+    counts = _matcher.count_matrix(texts)
+    return counts, _matcher.mentioned(counts)
+
+
+def apply_tags(df, counts, mentioned):
+    brand_names = list(BRAND_MAP)
+    df["提及的電動車品牌"] = mentioned
+    df[brand_names] = pd.DataFrame(counts, columns=brand_names, index=df.index)
+    return df
+
+
+# 依輸入順序產出 (批次, 結果)；最多同時送出 max_pending 批
+def tag_chunks(chunks, workers, max_pending):
+    if workers <= 1:
+        for df in chunks:
+            yield df, tag_texts(df["新聞內文"].fillna("").astype(str).tolist())
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        pending = deque()
+        for df in chunks:
+            pending.append((df, pool.submit(tag_texts, df["新聞內文"].fillna("").astype(str).tolist())))
+            if len(pending) >= max_pending:
+                df, future = pending.popleft()
+                yield df, future.result()
+        while pending:
+            df, future = pending.popleft()
+            yield df, future.result()
+
+
+class ChunkWriter:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.rows = 0
+        self.parquet = None
+        if fmt == "parquet" and pq is None:
+            raise ImportError("輸出 Parquet 需先安裝 pyarrow：pip install pyarrow")
+
+    def write(self, df):
+        if self.fmt == "csv":
+            first = self.rows == 0
+            df.to_csv(self.path, mode="w" if first else "a", header=first, index=False,
+                      encoding="utf-8-sig" if first else "utf-8")
+        else:
+            # schema 依欄位名稱決定，不從資料推斷：某批某欄全空時 pandas 會推成 float，與其他批不一致
+            if self.parquet is None:
+                self.parquet = pq.ParquetWriter(self.path, output_schema(df.columns))
+            counts = [c for c in df.columns if c in COUNT_COLUMNS]
+            df = df.assign(**{c: df[c].fillna(0).astype("int32") for c in counts})
+            self.parquet.write_table(pa.Table.from_pandas(df, schema=self.parquet.schema, preserve_index=False))
+        self.rows += len(df)
+
+    def close(self):
+        if self.parquet is not None:
+            self.parquet.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="標記新聞提及的電動車品牌")
+    parser.add_argument("--input", default="ddcar_ev_news.csv")
+    parser.add_argument("--output", default=None, help="預設為 ddcar_ev_news_with_brand.csv（或 .parquet）")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunksize", type=int, default=5000, help="每批讀入的文章數")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="比對品牌的行程數，1 為不開子行程")
+    args = parser.parse_args()
+    output = args.output or f"ddcar_ev_news_with_brand.{args.format}"
+
+    # Step 1: 分批載入內文資料；次數以外的欄位都當字串讀，每批型別一致
+    header = pd.read_csv(args.input, nrows=0).columns
+    chunks = pd.read_csv(args.input, chunksize=args.chunksize,
+                         dtype={c: str for c in header if c not in COUNT_COLUMNS})
+
+    # Step 2~4: 每批在子行程比對品牌（brand_matcher.py），依原順序寫入品牌欄位並輸出
+    writer = ChunkWriter(output, args.format)
+    try:
+        for df, (counts, mentioned) in tag_chunks(chunks, args.workers, max_pending=2 * args.workers):
+            writer.write(apply_tags(df, counts, mentioned))
+    finally:
+        writer.close()
+
+    # Step 5: 輸出結果
+    print(f"已輸出至 {output}（共 {writer.rows} 篇）")
+
+
+if __name__ == "__main__":
+    main()
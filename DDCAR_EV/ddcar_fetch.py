@@ -0,0 +1,145 @@
+# 文章抓取：文章頁不需要 JavaScript，用共用連線池的 requests.Session 搭配執行緒池並行下載
+# 每個網站同時最多 per_host 個請求、相鄰請求至少間隔 delay 秒，避免對 DDCAR 造成負擔
+# 解析不出內文的頁面（例如需要 JS 才會渲染）回傳 None，由呼叫端改用 Selenium 補抓
+# 帶入上次的 ETag / Last-Modified 時送出條件式請求，內容沒變的文章只會拿到 304
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "Mozilla/5.0 (compatible; ddcar-ev-research/1.0)"
+STOP_PHRASES = ["推薦閱讀", "DDCAR 有 LINE", "bit.ly", "ZeroWidthSpace"]
+ERROR_PHRASES = ["HTTP 400", "找不到網頁", "無法顯示頁面"]
+
+
+# 解析文章頁：回傳 (標題, 內文)；錯誤頁或內文太短回傳 None
+def parse_article(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    # 標題與內文
+    title_tag = soup.select_one("h1") or soup.select_one("title")
+    title = title_tag.get_text(strip=True) if title_tag else "無標題"
+
+    # 只抓乾淨的 <p> 段落文字，忽略含有圖片的，且濾掉含圖或廣告段的內文
+    clean_paragraphs = []
+    for p in soup.find_all("p"):
+        # 忽略含 <img> 的段落
+        if p.find("img"):
+            continue
+
+        text = p.get_text(strip=True)
+
+        # 若碰到廣告相關文字，則提早停止收集（避免抓到底部推薦段）
+        if any(phrase in text for phrase in STOP_PHRASES):
+            break
+
+        if text:
+            clean_paragraphs.append(text)
+
+    # 將有效段落組成一段內文
+    content = "\n".join(clean_paragraphs)
+
+    # 篩選掉錯誤頁面（常見 400 頁面內容或錯誤訊息）
+    if any(phrase in content for phrase in ERROR_PHRASES) or len(content.strip()) < 100:
+        return None
+    return title, content
+
+
+class HostThrottle:
+    """限制每個網站的同時請求數與請求間隔。"""
+
+    def __init__(self, per_host=2, delay=1.0):
+        self.per_host = per_host
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.hosts = {}  # host -> [Semaphore, 下一次可以送出請求的時間]
+
+    def __call__(self, url):
+        return _HostSlot(self, urlsplit(url).netloc)
+
+
+class _HostSlot:
+    def __init__(self, throttle, host):
+        self.throttle = throttle
+        with throttle.lock:
+            self.state = throttle.hosts.setdefault(host, [threading.Semaphore(throttle.per_host), 0.0])
+
+    def __enter__(self):
+        self.state[0].acquire()
+        with self.throttle.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.state[1] - now)
+            self.state[1] = max(now, self.state[1]) + self.throttle.delay
+        time.sleep(wait)
+
+    def __exit__(self, *exc):
+        self.state[0].release()
+
+
+@dataclass
+class FetchResult:
+    link: str
+    article: tuple = None  # (標題, 內文)；304、抓取失敗或解析不出內文時為 None
+    status: int = None  # HTTP 狀態碼，連線失敗為 None
+    etag: str = None
+    last_modified: str = None
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+class ArticleFetcher:
+    """並行下載文章頁。fetch_all(links, validators) 依輸入順序回傳 FetchResult 串列。
+
+    validators 為 {連結: {"etag": ..., "last_modified": ...}}，有提供的連結會送條件式請求。
+    """
+
+    def __init__(self, max_workers=8, per_host=2, delay=1.0, timeout=30, retries=2):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.throttle = HostThrottle(per_host, delay)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(
+            pool_connections=4, pool_maxsize=max_workers,
+            max_retries=Retry(total=retries, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def fetch(self, link, validators=None):
+        headers = {}
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        try:
+            with self.throttle(link):
+                response = self.session.get(link, headers=headers, timeout=self.timeout)
+            result = FetchResult(link, None, response.status_code, response.headers.get("ETag"),
+                                 response.headers.get("Last-Modified"))
+            if response.status_code == 304:
+                return result
+            response.raise_for_status()
+            result.article = parse_article(response.content)  # 交給 BeautifulSoup 依 <meta charset> 判斷編碼
+            return result
+        except requests.RequestException as e:
+            print(f"抓取失敗 {link}：{e}")
+            return FetchResult(link)
+
+    def fetch_all(self, links, validators=None):
+        validators = validators or {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(lambda link: self.fetch(link, validators.get(link)), links))
+
+    def close(self):
+        self.session.close()
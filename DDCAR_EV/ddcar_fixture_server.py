@@ -0,0 +1,139 @@
+# 本機 DDCAR 假網站：把存下來的 HTML 當靜態檔提供，讓爬蟲不連外網也能測試
+# 資料夾結構對應網址路徑，例如 fixtures/news/view/123/index.html 對應 /news/view/123/
+# 產生的列表頁和正式網站一樣是無限捲動：先顯示第一頁，捲到底時以 fetch 載入 /api/news/list/<頁碼>/ 的 HTML 片段
+# 用法：
+#   python ddcar_fixture_server.py --generate 200     # 產生 200 篇模擬文章到 fixtures/
+#   python ddcar_fixture_server.py --port 8766         # 啟動伺服器
+#   DDCAR_BASE_URL=http://127.0.0.1:8766 python ddcar_news_data_from_web.py
+
+import argparse
+import datetime
+import functools
+import os
+import random
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+LIST_PATH = "news/categories/0/即時新聞/list"
+PAGE_API_PATH = "api/news/list"
+PAGE_SIZE = 20
+SCROLL_SCRIPT = """<script>
+let page = 1, loading = false, done = false;
+window.addEventListener("scroll", () => {
+  if (loading || done || window.innerHeight + window.scrollY < document.body.scrollHeight - 50) return;
+  loading = true;
+  fetch("/%s/" + (page + 1) + "/").then(r => r.ok ? r.text() : "").then(html => {
+    if (html) { page += 1; document.getElementById("list").insertAdjacentHTML("beforeend", html); } else { done = true; }
+    loading = false;
+  });
+});
+</script>""" % PAGE_API_PATH
+BRAND_WORDS = ["Tesla", "特斯拉", "Hyundai", "現代", "BMW i", "Lexus", "Nissan", "Toyota", "豐田", "Mercedes",
+               "賓士", "Porsche", "保時捷", "BYD", "比亞迪", "Volvo", "Kia", "Ford"]
+MODEL_WORDS = ["Model Y", "Model 3", "Ioniq 5", "iX", "RZ", "Leaf", "bZ4X", "EQE", "Taycan", "Atto 3", "EX30", "EV6"]
+FILLER = ["電動車市場持續升溫", "續航里程表現亮眼", "充電網路逐步完善", "新車預計第三季上市", "官方公布最新售價",
+          "車廠宣布擴大投資", "電池技術再升級", "補助政策有所調整", "銷售數字創下新高"]
+
+
+# 和正式網站一樣回傳 ETag / Last-Modified，並對條件式請求回 304（If-Modified-Since 由 SimpleHTTPRequestHandler 處理）
+class FixtureHandler(SimpleHTTPRequestHandler):
+    etag = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, "index.html")
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return None
+            self.etag = etag
+        return super().send_head()
+
+    def end_headers(self):
+        if self.etag:
+            self.send_header("ETag", self.etag)
+            self.etag = None
+        super().end_headers()
+
+
+def article_html(article_id, rng, date):
+    paragraphs = []
+    for _ in range(rng.randint(4, 8)):
+        words = rng.sample(FILLER, 3) + [rng.choice(BRAND_WORDS), rng.choice(MODEL_WORDS)]
+        rng.shuffle(words)
+        paragraphs.append(f"<p>{'，'.join(words)}。</p>")
+    paragraphs.append('<p><img src="/ad.png"></p>')
+    paragraphs.append("<p>推薦閱讀：其他新聞</p>")
+    return (
+        f'<html><head><meta charset="utf-8"><title>DDCAR 新聞 {article_id}</title></head><body>'
+        f'<h1>電動車新聞 {article_id}</h1><time datetime="{date.isoformat()}">{date:%Y/%m/%d}</time>'
+        f'{"".join(paragraphs)}</body></html>'
+    )
+
+
+def items_html(items):
+    return "".join(
+        f'<div class="news-item"><a class="title my-2" href="/news/view/{article_id}/">電動車新聞 {article_id}</a>'
+        f'<span class="date">{date:%Y/%m/%d}</span></div>'
+        for article_id, date in items
+    )
+
+
+def list_html(items):
+    return (
+        f'<html><head><meta charset="utf-8"><title>即時新聞</title></head><body>'
+        f'<div id="list">{items_html(items)}</div>{SCROLL_SCRIPT}</body></html>'
+    )
+
+
+# 產生模擬文章：id 由新到舊，每天約 5 篇
+def generate(directory, count, seed=0):
+    rng = random.Random(seed)
+    directory = Path(directory)
+    today = datetime.date.today()
+    items = [(100000 + count - i, today - datetime.timedelta(days=i // 5)) for i in range(count)]
+    for article_id, date in items:
+        path = directory / "news" / "view" / str(article_id) / "index.html"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(article_html(article_id, rng, date), encoding="utf-8")
+    list_path = directory / LIST_PATH / "index.html"
+    list_path.parent.mkdir(parents=True, exist_ok=True)
+    list_path.write_text(list_html(items[:PAGE_SIZE]), encoding="utf-8")
+    for page, start in enumerate(range(PAGE_SIZE, count, PAGE_SIZE), 2):
+        page_path = directory / PAGE_API_PATH / str(page) / "index.html"
+        page_path.parent.mkdir(parents=True, exist_ok=True)
+        page_path.write_text(items_html(items[start:start + PAGE_SIZE]), encoding="utf-8")
+    return items
+
+
+# 在背景執行緒啟動伺服器，回傳 server（server.server_address 可取得實際 port）
+def start_server(directory="fixtures", port=0):
+    handler = functools.partial(FixtureHandler, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ddcar-fixtures", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機 DDCAR 假網站")
+    parser.add_argument("--dir", default="fixtures", help="HTML 檔案所在資料夾")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--generate", type=int, default=0, help="先產生 N 篇模擬文章")
+    args = parser.parse_args()
+    if args.generate:
+        generate(args.dir, args.generate)
+        print(f"已產生 {args.generate} 篇模擬文章到 {args.dir}/")
+    handler = functools.partial(FixtureHandler, directory=args.dir)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"DDCAR 假網站已啟動：http://127.0.0.1:{args.port}/{LIST_PATH}/")
+    server.serve_forever()
@@ -0,0 +1,150 @@
+# 本機假 Groq 伺服器：提供 OpenAI 相容的 /openai/v1/chat/completions，用來測試 ddcar_related_terms.py 不必連外網
+# 回覆依文章中出現的車款（ddcar_fixture_server.MODEL_WORDS）產生 JSON，單篇與多篇合併的 prompt 都支援，
+# 並模擬 Groq 的 x-ratelimit-* 標頭：每分鐘請求數 / token 數超過上限時回 429 與 retry-after
+# 用法：python ddcar_mock_groq.py --port 8767 --rpm 30 --tpm 6000 --latency 0.5 [--drop-rate 0.05]
+#       GROQ_API_URL=http://127.0.0.1:8767/openai/v1/chat/completions python ddcar_related_terms.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ddcar_fixture_server import MODEL_WORDS
+
+MODEL_BRANDS = {
+    "Model Y": "Tesla", "Model 3": "Tesla", "Ioniq 5": "Hyundai", "iX": "BMW", "RZ": "Lexus", "Leaf": "Nissan",
+    "bZ4X": "Toyota", "EQE": "Mercedes", "Taycan": "Porsche", "Atto 3": "BYD", "EX30": "Volvo", "EV6": "Kia",
+}
+BATCH_HEADER = re.compile(r"=== 文章 (\S+) ===")
+
+
+def models_in(article):
+    found = {}
+    for model in MODEL_WORDS:
+        if model in article:
+            found.setdefault(MODEL_BRANDS.get(model, "其他"), []).append(model)
+    return found
+
+
+# 依 prompt 產生 JSON 回覆：多篇文章時為 {文章 id: {品牌: [車款]}}，單篇時為 {品牌: [車款]}
+# drop_rate > 0 時，多篇回覆會隨機漏掉或弄壞部分文章的結果，用來測試逐篇重送
+def reply_for(prompt, drop_rate=0.0, rng=random):
+    parts = BATCH_HEADER.split(prompt)
+    if len(parts) > 1:
+        result = {}
+        for article_id, article in zip(parts[1::2], parts[2::2]):
+            if rng.random() < drop_rate:
+                if rng.random() < 0.5:
+                    result[article_id] = "（無法判斷）"
+                continue
+            result[article_id] = models_in(article)
+        return json.dumps(result, ensure_ascii=False)
+    article = prompt.split("---")[1] if prompt.count("---") >= 2 else prompt
+    return json.dumps(models_in(article), ensure_ascii=False)
+
+
+class Usage:
+    """過去 60 秒內的請求與 token 用量，超過 rpm / tpm 時拒絕。"""
+
+    def __init__(self, rpm, tpm, rpd):
+        self.lock = threading.Lock()
+        self.rpm, self.tpm, self.rpd = rpm, tpm, rpd
+        self.window = deque()  # (時間, token 數)
+        self.day_count = 0
+        self.stats = {"ok": 0, "rate_limited": 0}
+
+    def take(self, tokens):
+        """回傳 (是否允許, 標頭)。"""
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0][0] >= 60:
+                self.window.popleft()
+            used = sum(t for _, t in self.window)
+            allowed = len(self.window) < self.rpm and used + tokens <= self.tpm and self.day_count < self.rpd
+            if allowed:
+                self.window.append((now, tokens))
+                self.day_count += 1
+                used += tokens
+            reset_tokens = 60 - (now - self.window[0][0]) if self.window else 0
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpd),
+                "x-ratelimit-limit-tokens": str(self.tpm),
+                "x-ratelimit-remaining-requests": str(self.rpd - self.day_count),
+                "x-ratelimit-remaining-tokens": str(max(0, self.tpm - used)),
+                "x-ratelimit-reset-requests": "24h0m0s",
+                "x-ratelimit-reset-tokens": f"{reset_tokens:.2f}s",
+            }
+            if not allowed:
+                headers["retry-after"] = str(max(1, int(reset_tokens + 0.999)))
+            self.stats["ok" if allowed else "rate_limited"] += 1
+            return allowed, headers
+
+
+def make_handler(usage, latency, drop_rate=0.0):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            prompt = body["messages"][-1]["content"]
+            text = reply_for(prompt, drop_rate)
+            # 與 groq_pool 相同的粗估方式：一字一 token
+            tokens = sum(len(m["content"]) for m in body["messages"]) + len(text)
+            allowed, headers = usage.take(tokens)
+            if not allowed:
+                self._send(429, {"error": {"message": "Rate limit reached", "type": "tokens"}}, headers)
+                return
+            time.sleep(latency)
+            self._send(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": tokens - len(text), "completion_tokens": len(text), "total_tokens": tokens},
+            }, headers)
+
+        def _send(self, status, payload, headers):
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+# 在背景執行緒啟動伺服器，回傳 server（server.usage.stats 可取得成功 / 429 次數）
+def start_server(port=0, rpm=30, tpm=6000, rpd=14400, latency=0.5, drop_rate=0.0):
+    usage = Usage(rpm, tpm, rpd)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(usage, latency, drop_rate))
+    server.daemon_threads = True
+    server.usage = usage
+    threading.Thread(target=server.serve_forever, name="ddcar-mock-groq", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機假 Groq 伺服器")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--rpm", type=int, default=30, help="每分鐘請求數上限")
+    parser.add_argument("--tpm", type=int, default=6000, help="每分鐘 token 數上限")
+    parser.add_argument("--rpd", type=int, default=14400, help="每日請求數上限")
+    parser.add_argument("--latency", type=float, default=0.5, help="每個請求的回應時間（秒）")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="多篇回覆中每篇結果遺漏或格式錯誤的機率")
+    args = parser.parse_args()
+    usage = Usage(args.rpm, args.tpm, args.rpd)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(usage, args.latency, args.drop_rate))
+    print(f"假 Groq 伺服器已啟動：http://127.0.0.1:{args.port}/openai/v1/chat/completions")
+    server.serve_forever()
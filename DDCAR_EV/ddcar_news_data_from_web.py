@@ -1,117 +1,181 @@
 # 用來「滑動到底」以觸發載入更多新聞
+# 只有列表頁的無限捲動需要 Selenium；文章頁改由 ddcar_fetch.py 以連線池並行下載，抓不到內文的才用 Selenium 補抓
+# 設定 DDCAR_BASE_URL 可改連本機假網站（ddcar_fixture_server.py）
+# 預設為增量模式：已抓過的連結記在 ddcar_crawl.db，捲動到看過的文章就停，新文章附加到 CSV 後面
+# 列表頁探索見 ddcar_discovery.py：等連結數量變多而非固定 sleep，偵測到分頁 XHR 後直接呼叫
+# 用法：python ddcar_news_data_from_web.py [--refresh] [--full] [--max-articles N] [--since YYYY-MM-DD]
 from selenium import webdriver
-from bs4 import BeautifulSoup
-from collections import Counter
 import pandas as pd
 import time
-import re
+import os
+import argparse
 import datetime
-
-# 1. 設定 Selenium
-options = webdriver.ChromeOptions()
-options.add_argument("--headless")  # 不開啟視窗
-driver = webdriver.Chrome(options=options)
-
-# 2. 打開即時新聞頁面
-url = "https://www.ddcar.com.tw/news/categories/0/%E5%8D%B3%E6%99%82%E6%96%B0%E8%81%9E/list/"
-driver.get(url)
-
-# 3. 向下滑動 50 次，每次滑動後暫停 10 秒，讓網站有時間載入更多新聞（無限捲動機制）
-last_height = driver.execute_script("return document.body.scrollHeight")
+from pathlib import Path
+from ddcar_discovery import LinkDiscovery
+from brand_matcher import BrandMatcher, SCRAPER_BRAND_MAP
+from ddcar_fetch import ArticleFetcher, HostThrottle, parse_article
+from ddcar_store import SeenStore, canonical_url, content_hash, stable_id
+
+BASE_URL = os.getenv("DDCAR_BASE_URL", "https://www.ddcar.com.tw").rstrip("/")
+LIST_URL = f"{BASE_URL}/news/categories/0/%E5%8D%B3%E6%99%82%E6%96%B0%E8%81%9E/list/"
 SCROLL_LIMIT = 50
-for i in range(SCROLL_LIMIT):
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-    time.sleep(10)  # 每次滑動後等待 10 秒載入 JS 內容
-    new_height = driver.execute_script("return document.body.scrollHeight")
-    if new_height == last_height:
-        print(f"已滑到底，總共滑動 {i+1} 次")
-        break
-    last_height = new_height
-
-
-# 4. 抓新聞連結
-html = driver.page_source
-soup = BeautifulSoup(html, "html.parser")
-base_url = "https://www.ddcar.com.tw"
-links = [a["href"] for a in soup.select("a.title.my-2") if a.has_attr("href")]
-print(f"共擷取文章數：{len(links)}")
-
-
-# 5. 設定品牌關鍵字
-brands = ["Tesla", "Hyundai", "BMW i", "Lexus", "Nissan", "Toyota", "Mercedes", "Porsche"]
-brand_pattern = re.compile("|".join(brands), re.IGNORECASE)
-
-# 6. 抓取每篇新聞並統計品牌名稱出現次數
-data = []
-# 使用今天日期 + 編號當作主鍵 id
-today = datetime.date.today().strftime("%Y%m%d")
-
-for idx, link in enumerate(links, 1):
-    try:
-        driver.set_page_load_timeout(30)  # 設定單篇最大等待 30 秒
-        driver.get(link)
-        time.sleep(4)
+USE_XHR = os.getenv("DDCAR_USE_XHR", "1") != "0"  # 偵測到分頁 XHR 後直接呼叫，0 則一律用捲動
+FETCH_WORKERS = int(os.getenv("DDCAR_FETCH_WORKERS", "8"))
+PER_HOST = int(os.getenv("DDCAR_PER_HOST", "2"))  # 同一網站同時最多幾個請求
+FETCH_DELAY = float(os.getenv("DDCAR_FETCH_DELAY", "1.0"))  # 同一網站相鄰請求的最短間隔（秒）
+OUTPUT_CSV = "ddcar_ev_news.csv"
+STORE_PATH = "ddcar_crawl.db"
 
-        article_html = driver.page_source
-        article_soup = BeautifulSoup(article_html, "html.parser")
+# 品牌關鍵字（與 ddcar_ev_news_with_brands.py 共用 brand_matcher 的比對引擎）
+brand_matcher = BrandMatcher(SCRAPER_BRAND_MAP, boundary_max_len=0)
+brands = brand_matcher.brands
 
-        # 標題與內文
-        title_tag = article_soup.select_one("h1") or article_soup.select_one("title")
-        title = title_tag.get_text(strip=True) if title_tag else "無標題"
-        
-        # 改成只抓乾淨的 <p> 段落文字，忽略含有圖片的，且濾掉含圖或廣告段的內文
-        paragraphs = article_soup.find_all("p")
-        clean_paragraphs = []
-        stop_phrases = ["推薦閱讀", "DDCAR 有 LINE", "bit.ly", "ZeroWidthSpace"]
 
-        for p in paragraphs:
-            # 忽略含 <img> 的段落
-            if p.find("img"):
-                continue
-
-            text = p.get_text(strip=True)
-
-            # 若碰到廣告相關文字，則提早停止收集（避免抓到底部推薦段）
-            if any(phrase in text for phrase in stop_phrases):
-                break
-
-            if text:
-                clean_paragraphs.append(text)
-
-        # 將有效段落組成一段內文
-        content = "\n".join(clean_paragraphs)
-
-        # 篩選掉錯誤頁面（常見 400 頁面內容或錯誤訊息）
-        if "HTTP 400" in content or "找不到網頁" in content or "無法顯示頁面" in content or len(content.strip()) < 100:
-            print(f"⚠️ 無效文章跳過：{link}")
-            continue
+# 1. 設定 Selenium
+def make_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")  # 不開啟視窗
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(30)  # 設定單頁最大等待 30 秒
+    return driver
 
-        # 統計品牌
-        matches = brand_pattern.findall(content)
-        match_counter = Counter([m.title() if m.lower() != "bmw i" else "BMW i" for m in matches])
-        mentioned_brands = "、".join(sorted(set(match_counter.keys()), key=lambda x: brands.index(x))) if match_counter else ""
 
-        # 構建資料行
-        row = {
-            "id": f"{today}{idx:02d}",
-            "新聞標題": title,
-            "新聞內文": content.replace("\\n", "").replace("\\r", "").strip(),
-            "提及的電動車品牌": mentioned_brands,
-            "連結": link
-        }
-        for brand in brands:
-            row[brand] = match_counter.get(brand, 0)
+# 2. 打開即時新聞頁面，向下滑動最多 50 次載入更多新聞（無限捲動機制）
+# 列表由新到舊，達到目標篇數、早於 since 或 stop(links) 回傳 True（例如已出現抓過的文章）時就不再往下捲
+def discover_links(driver, stop=None, max_count=None, since=None):
+    discovery = LinkDiscovery(driver, BASE_URL, scroll_limit=SCROLL_LIMIT, max_count=max_count, since=since,
+                              stop=stop, use_xhr=USE_XHR, throttle=HostThrottle(per_host=1, delay=FETCH_DELAY))
+    return discovery.run(LIST_URL)
 
-        data.append(row)
 
+# HTTP 抓不到內文時的備援：用瀏覽器載入並等 JS 渲染
+def fetch_with_selenium(driver, link):
+    try:
+        driver.get(link)
+        time.sleep(4)
+        return parse_article(driver.page_source)
     except Exception as e:
         print(f"抓取失敗 {link}：{e}")
-        continue
-
-driver.quit()
-
-# 7. 統計結果輸出為 CSV
-df = pd.DataFrame(data)
-df.to_csv("ddcar_ev_news.csv", index=False, encoding="utf-8-sig")
-print("已儲存為 ddcar_ev_news.csv")
+        return None
+
+
+# 統計品牌名稱出現次數
+def count_brands(content):
+    counts = brand_matcher.count(content)
+    return brand_matcher.mentioned(counts), dict(zip(brands, counts.tolist()))
+
+
+# 構建資料行
+def build_row(link, title, content):
+    mentioned_brands, match_counter = count_brands(content)
+    row = {
+        "id": stable_id(link),
+        "新聞標題": title,
+        "新聞內文": content.replace("\\n", "").replace("\\r", "").strip(),
+        "提及的電動車品牌": mentioned_brands,
+        "連結": link
+    }
+    for brand in brands:
+        row[brand] = match_counter.get(brand, 0)
+    return row
+
+
+# 第一次用增量模式時，把現有 CSV 的連結記進 store，避免重抓
+def seed_store(store):
+    if len(store) or not Path(OUTPUT_CSV).exists():
+        return
+    existing = pd.read_csv(OUTPUT_CSV, usecols=["連結", "新聞內文"], dtype=str).fillna("")
+    for link, content in zip(existing["連結"], existing["新聞內文"]):
+        store.record(link, content_hash(content))
+    print(f"已從 {OUTPUT_CSV} 匯入 {len(existing)} 筆已抓取連結")
+
+
+# 3. 寫出 CSV：新文章附加在後面；內容有更新的文章以新資料取代原本那一列
+def save_rows(rows, updated_links, full):
+    if not rows:
+        print("沒有新文章")
+        return
+    df = pd.DataFrame(rows)
+    path = Path(OUTPUT_CSV)
+    if full or not path.exists():
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    elif updated_links:
+        existing = pd.read_csv(path, dtype={"id": str})
+        existing = existing[~existing["連結"].map(canonical_url).isin(updated_links)]
+        pd.concat([existing, df], ignore_index=True).to_csv(path, index=False, encoding="utf-8-sig")
+    else:
+        df.to_csv(path, mode="a", header=False, index=False, encoding="utf-8")
+    print(f"已儲存為 {OUTPUT_CSV}（新增或更新 {len(rows)} 筆）")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DDCAR 即時新聞爬蟲")
+    parser.add_argument("--full", action="store_true", help="忽略抓取紀錄，全部重抓並覆寫 CSV")
+    parser.add_argument("--refresh", action="store_true", help="對列表上抓過的文章送條件式請求，內容有變才更新")
+    parser.add_argument("--max-articles", type=int, default=None, help="列表最多收集幾篇")
+    parser.add_argument("--since", type=datetime.date.fromisoformat, default=None, help="只收集此日期（含）之後的文章")
+    args = parser.parse_args()
+
+    store = SeenStore(STORE_PATH)
+    if not args.full:
+        seed_store(store)
+    seen = (lambda link: False) if args.full else store.is_seen
+
+    driver = make_driver()
+    try:
+        # 增量模式：這一批連結中出現看過的文章，表示更舊的都已經抓過
+        links = discover_links(driver, stop=None if args.full else lambda links: any(seen(l) for l in links),
+                               max_count=args.max_articles, since=args.since)
+        new_links = [link for link in links if not seen(link)]
+        refresh_links = [link for link in links if seen(link)] if args.refresh else []
+        print(f"共擷取文章數：{len(links)}（新文章 {len(new_links)} 篇，重新檢查 {len(refresh_links)} 篇）")
+
+        # 並行抓取每篇新聞；重新檢查的文章帶上次的 ETag / Last-Modified
+        start = time.perf_counter()
+        fetcher = ArticleFetcher(max_workers=FETCH_WORKERS, per_host=PER_HOST, delay=FETCH_DELAY)
+        try:
+            results = fetcher.fetch_all(new_links + refresh_links, {link: store.get(link) for link in refresh_links})
+        finally:
+            fetcher.close()
+        print(f"HTTP 抓取完成：耗時 {time.perf_counter() - start:.1f} 秒")
+        for result in results:
+            if result.article is None and not result.not_modified:
+                result.article = fetch_with_selenium(driver, result.link)
+    finally:
+        driver.quit()
+
+    # 4. 統計品牌並構建資料行；內容 hash 沒變的文章不重寫
+    # 抓取紀錄等 CSV 寫入成功後才更新，寫入失敗時下次執行仍會把這些文章當成新文章重抓
+    rows, updated_links, records = [], set(), []
+    unchanged = 0
+    for result in results:
+        if result.not_modified:
+            records.append((result.link,))
+            unchanged += 1
+            continue
+        # 篩選掉錯誤頁面（常見 400 頁面內容或錯誤訊息）
+        if result.article is None:
+            print(f"⚠️ 無效文章跳過：{result.link}")
+            continue
+        title, content = result.article
+        digest = content_hash(content)
+        previous = store.get(result.link)
+        records.append((result.link, digest, result.etag, result.last_modified))
+        if previous and previous["content_hash"] == digest and not args.full:
+            unchanged += 1
+            continue
+        if previous and not args.full:
+            updated_links.add(canonical_url(result.link))
+        rows.append(build_row(result.link, title, content))
+    if unchanged:
+        print(f"{unchanged} 篇文章內容沒有變動")
 
+    try:
+        save_rows(rows, updated_links, args.full)
+        for record in records:
+            store.record(*record)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
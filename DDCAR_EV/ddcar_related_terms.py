@@ -1,96 +1,328 @@
 # ddcar_related_terms.py
+# 以 Groq LLM 找出每篇新聞提到的車款：多執行緒併發送出，速率依 Groq 的 rate-limit 標頭自動調整（groq_pool.py）
+# 短文章會在 token 預算內合併成一個請求，要求以文章 id 為 key 的 JSON 回覆；某篇結果缺漏或格式錯誤時改為單篇重送
+# 回應以內容 hash 快取在 SQLite，每篇完成就寫入 checkpoint，中斷後重跑會從上次的進度繼續
+# 送出前先篩選：能用本機車款字典（model_dictionary.py，由先前的分析結果建立）明確判定的文章不送；
+# 完全沒有提到車廠的文章也直接略過：品牌欄位為空，且標題與內文比對不到 EV_BRAND_MAP 的任何車廠
+# （比 BRAND_MAP 寬，納智捷、小鵬等沒有品牌欄位的車廠仍會送 LLM）；加上 --include-brandless 則照樣送出。
+# 本機字典可判定的文章仍依內文 hash 抽樣 --audit-rate 送 LLM，讓字典能學到既有品牌的新車款（中文車名等字典偵測不到的情況）。
+# checkpoint 已有 LLM 結果的文章一律沿用該結果。「車款判定方式」欄位記錄每篇的結果來源
+# 用法：python ddcar_related_terms.py [--input ddcar_ev_news_with_brand.csv] [--output ddcar_ev_news_with_tags.csv]
+#       [--concurrency 4] [--rpm 30] [--tpm 6000] [--batch-tokens 3000] [--batch-size 8] [--restart] [--all] [--include-brandless]
+# 本機測試：先啟動 ddcar_mock_groq.py，再設定 GROQ_API_URL=http://127.0.0.1:8767/openai/v1/chat/completions
 
-import pandas as pd
-import time
-import requests
-import re 
+import argparse
+import json
 import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
 from dotenv import load_dotenv
 
+from brand_matcher import BRAND_MAP, EV_BRAND_MAP, BrandMatcher
+from ddcar_store import content_hash
+from groq_pool import GroqPool, RateLimiter, ResponseCache
+from model_dictionary import ModelDictionary
+
 load_dotenv()
 
 # Groq API 設定
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
 GROQ_API_KEY = os.getenv("API_KEY")
-
-headers = {
-    "Authorization": f"Bearer {GROQ_API_KEY}",
-    "Content-Type": "application/json"
-}
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-70b-8192")
+SYSTEM_PROMPT = "你是一位專業的電動車評論分析員。"
+MAX_CONTENT_CHARS = 8000  # 若內文太長可截斷
+BATCH_OVERHEAD = 400  # 多篇 prompt 的固定說明文字（字數）
+TOKENS_PER_RESULT = 128  # 多篇請求時每篇預留的回應 token 數
+JSON_BLOCK = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+METHOD_COLUMN = "車款判定方式"
+NO_BRAND, LOCAL, LLM = "無品牌", "本機字典", "LLM"
 
 
 # LLM prompt：找出品牌與車款
 def build_prompt(content):
     return f"""
 你是一個電動車分析助手。根據以下文章，請判斷是否提到了具體車款名稱，並將它們對應到所屬品牌（如 Tesla 的 Model Y）。
-請用以下格式輸出：
-品牌名: [車款1, 車款2, ...]
+請只輸出 JSON，格式如下：
+{{"品牌名": ["車款1", "車款2"]}}
 
 文章內容：
 ---
 {content}
 ---
-請注意：如果沒有提到任何具體車款，可以回傳空字典，例如：{{}}。
+請注意：如果沒有提到任何具體車款，請回傳空物件：{{}}。
+"""
+
+
+# 多篇文章合併的 prompt；articles 為 [(文章 id, 內文), ...]
+def build_batch_prompt(articles):
+    sections = "\n".join(f"=== 文章 {article_id} ===\n{content}" for article_id, content in articles)
+    return f"""
+你是一個電動車分析助手。以下有 {len(articles)} 篇文章，每篇以「=== 文章 id ===」開頭。
+請分別判斷每篇是否提到了具體車款名稱，並將它們對應到所屬品牌（如 Tesla 的 Model Y）。
+請只輸出 JSON，以文章 id 為 key，格式如下：
+{{"1": {{"品牌名": ["車款1", "車款2"]}}, "2": {{}}}}
+每篇文章都必須有對應的 key；沒有提到任何具體車款的文章請對應空物件 {{}}。
+
+{sections}
 """
 
-# 呼叫 Groq API 分析
-def call_groq(content, max_retries=3):
-    payload = {
-        "model": "llama3-70b-8192",
-        "messages": [
-            {"role": "system", "content": "你是一位專業的電動車評論分析員。"},
-            {"role": "user", "content": build_prompt(content)}
-        ],
-        "temperature": 0.3
-    }
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            res = requests.post(GROQ_API_URL, headers=headers, json=payload, timeout=60)
-            if res.status_code == 429:
-                wait_time = 5 * attempt
-                print(f"⏳ 第 {attempt} 次：429 限流，等待 {wait_time} 秒再試...")
-                time.sleep(wait_time)
+
+# 呼叫 Groq API 分析單篇
+def call_groq(client, content):
+    return client.chat([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_prompt(content)}
+    ], json_mode=True, validate=lambda text: parse_models(text) is not None)
+
+
+# 呼叫 Groq API 一次分析多篇，文章 id 依序為 "1"、"2"…
+def call_groq_batch(client, contents):
+    articles = [(str(i), content) for i, content in enumerate(contents, 1)]
+    return client.chat([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_batch_prompt(articles)}
+    ], max_tokens=TOKENS_PER_RESULT * len(articles), json_mode=True,
+        validate=lambda text: _json_object(text) is not None)
+
+
+# 從回覆中取出 JSON 物件（容許前後有說明文字或 ``` 區塊），不是物件時回傳 None
+def _json_object(text):
+    text = (text or "").strip()
+    block = JSON_BLOCK.search(text)
+    if block:
+        text = block.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+# 檢查 {品牌: [車款, ...]} 的結構，格式不符時回傳 None；去掉空白與空的品牌
+def validate_models(data):
+    if not isinstance(data, dict):
+        return None
+    result = {}
+    for brand, models in data.items():
+        if not isinstance(models, list) or not all(isinstance(m, str) for m in models):
+            return None
+        models = [m.strip() for m in models if m.strip()]
+        if models:
+            result[str(brand).strip()] = models
+    return result
+
+
+# 解析單篇回覆，回傳 {品牌: [車款, ...]}；格式錯誤時回傳 None
+def parse_models(llm_response):
+    return validate_models(_json_object(llm_response))
+
+
+# 解析多篇回覆，回傳 {文章 id: {品牌: [車款, ...]}}，只包含格式正確的文章
+def parse_batch(llm_response, article_ids):
+    data = _json_object(llm_response) or {}
+    results = {}
+    for article_id in article_ids:
+        models = validate_models(data.get(article_id))
+        if models is not None:
+            results[article_id] = models
+    return results
+
+
+# 所有車款名稱，去重後排序
+def format_models(models):
+    return "、".join(sorted({m for items in models.values() for m in items}))
+
+
+# 依序把短文章裝進不超過 budget 字的批次；單篇就超過預算的文章另外列出逐篇送
+def pack_batches(items, budget, max_articles):
+    batches, singles, current, size = [], [], [], BATCH_OVERHEAD
+    for key, content in items:
+        cost = len(content) + 20
+        if budget <= 0 or max_articles <= 1 or BATCH_OVERHEAD + cost > budget:
+            singles.append(key)
+            continue
+        if current and (size + cost > budget or len(current) >= max_articles):
+            batches.append(current)
+            current, size = [], BATCH_OVERHEAD
+        current.append(key)
+        size += cost
+    if current:
+        batches.append(current)
+    # 只有一篇的批次直接用單篇 prompt
+    singles.extend(batch[0] for batch in batches if len(batch) == 1)
+    return [batch for batch in batches if len(batch) > 1], singles
+
+
+# 讀取 checkpoint：{內文 hash: {品牌: [車款]}}；中斷時最後一行可能不完整，直接略過
+def load_checkpoint(path):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
                 continue
-            res.raise_for_status()
-            return res.json()["choices"][0]["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            print(f"⚠️ Groq API error (嘗試 {attempt}/{max_retries}):", e)
-            time.sleep(5 * attempt)
-    return ""
-
-
-# 擷取所有車款名稱（來自每個 [] 區段）
-def extract_models(llm_response):
-    pattern = r"\[([^\]]+)\]"
-    matches = re.findall(pattern, llm_response)
-    models = []
-    for match in matches:
-        items = [x.strip() for x in match.split(",") if x.strip()]
-        models.extend(items)
-    # 去重後排序
-    models = sorted(set(models))
-    return "、".join(models) if models else ""
-
-# 讀檔案
-df = pd.read_csv("ddcar_ev_news_with_brand.csv")
-
-llm_responses = []
-car_model_tags = []
-
-# 開始分析每一篇
-for idx, row in df.iterrows():
-    print(f"🔍 分析第 {idx+1} 篇文章...")
-    content = str(row["新聞內文"])[:8000]  # 若內文太長可截斷
-    llm_output = call_groq(content)
-    llm_responses.append(llm_output)
-    car_model_tags.append(extract_models(llm_output))
-    time.sleep(5)
-
-# 加欄位
-df["品牌相關標籤（LLM）"] = llm_responses
-df["相關車款列表"] = car_model_tags
-
-# 輸出結果
-df.to_csv("ddcar_ev_news_with_tags.csv", index=False, encoding="utf-8-sig")
-print("✅ 已儲存結果至 ddcar_ev_news_with_tags.csv")
+            if "models" in record:
+                done[record["hash"]] = record["models"]
+    return done
+
+
+# 每篇文章標記的品牌：品牌次數欄位大於 0 或列在「提及的電動車品牌」；輸入沒有品牌欄位時回傳 None（不篩選）
+def mentioned_brands(df):
+    count_columns = [brand for brand in BRAND_MAP if brand in df.columns]
+    if not count_columns and "提及的電動車品牌" not in df.columns:
+        return None
+    counts = df[count_columns].fillna(0).to_numpy() if count_columns else None
+    listed = df["提及的電動車品牌"].fillna("").astype(str) if "提及的電動車品牌" in df.columns else [""] * len(df)
+    brands = []
+    for i, text in enumerate(listed):
+        row = {brand for brand in text.split("、") if brand}
+        if counts is not None:
+            row.update(count_columns[j] for j in counts[i].nonzero()[0])
+        brands.append(row)
+    return brands
+
+
+# 先前輸出檔中由 LLM 判定的結果，用來建立車款字典；舊格式（非 JSON）只在文章僅有一個品牌時採用「相關車款列表」
+def previous_results(path):
+    if not os.path.exists(path):
+        return []
+    df = pd.read_csv(path)
+    if "相關車款列表" not in df.columns:
+        return []
+    if METHOD_COLUMN in df.columns:
+        df = df[df[METHOD_COLUMN] == LLM]
+    brands = mentioned_brands(df) or [set()] * len(df)
+    labels = df["品牌相關標籤（LLM）"] if "品牌相關標籤（LLM）" in df.columns else [""] * len(df)
+    records = []
+    for label, models, row_brands in zip(labels, df["相關車款列表"].fillna("").astype(str), brands):
+        parsed = parse_models(label) if isinstance(label, str) else None
+        if parsed is not None:
+            records.append(parsed)
+        elif models and len(row_brands) == 1:
+            records.append({next(iter(row_brands)): models.split("、")})
+    return records
+
+
+# 依內文 hash 決定是否抽中，同一篇每次結果相同
+def sampled(h, rate):
+    return int(h[:8], 16) / 0x100000000 < rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以 Groq LLM 標記新聞提到的車款")
+    parser.add_argument("--input", default="ddcar_ev_news_with_brand.csv")
+    parser.add_argument("--output", default="ddcar_ev_news_with_tags.csv")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("GROQ_CONCURRENCY", "4")),
+                        help="同時進行的 API 請求數")
+    parser.add_argument("--rpm", type=int, default=int(os.getenv("GROQ_RPM", "30")), help="每分鐘請求數上限")
+    parser.add_argument("--tpm", type=int, default=int(os.getenv("GROQ_TPM", "6000")),
+                        help="每分鐘 token 數上限（收到回應後改以 rate-limit 標頭為準）")
+    parser.add_argument("--batch-tokens", type=int, default=int(os.getenv("GROQ_BATCH_TOKENS", "3000")),
+                        help="多篇合併時每個 prompt 的字數預算，0 為每篇單獨送出")
+    parser.add_argument("--batch-size", type=int, default=8, help="每個請求最多合併的文章數")
+    parser.add_argument("--cache", default="groq_cache.db", help="LLM 回應快取（SQLite）")
+    parser.add_argument("--checkpoint", default=None, help="預設為 <output>.checkpoint.jsonl")
+    parser.add_argument("--restart", action="store_true", help="忽略既有 checkpoint，從頭分析（快取仍會使用）")
+    parser.add_argument("--all", action="store_true", help="不做預先篩選，每篇都送 LLM")
+    parser.add_argument("--include-brandless", action="store_true",
+                        help="沒有提到任何車廠（品牌欄位、標題與內文都比對不到）的文章也送 LLM")
+    parser.add_argument("--min-count", type=int, default=2, help="車款在先前結果中至少出現幾次才收進本機字典")
+    parser.add_argument("--audit-rate", type=float, default=0.05,
+                        help="本機字典可判定的文章中，仍送 LLM 的抽樣比例（依內文 hash 固定抽樣）")
+    args = parser.parse_args()
+    checkpoint = args.checkpoint or args.output + ".checkpoint.jsonl"
+
+    # 讀檔案
+    df = pd.read_csv(args.input)
+    contents = [str(text)[:MAX_CONTENT_CHARS] for text in df["新聞內文"]]
+    hashes = [content_hash(text) for text in contents]
+
+    if args.restart and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    done = load_checkpoint(checkpoint)
+
+    # 預先篩選：已有 LLM 結果的沿用、沒有提到車廠的略過、本機字典能明確判定的直接填入，其餘才送 LLM
+    methods = [LLM] * len(df)
+    local = {}
+    brands = None if args.all else mentioned_brands(df)
+    if brands is not None:
+        dictionary = ModelDictionary(previous_results(args.output) + list(done.values()), min_count=args.min_count)
+        print(f"本機車款字典：{len(dictionary)} 個車款")
+        gate = None if args.include_brandless else BrandMatcher(EV_BRAND_MAP)
+        titles = df["新聞標題"].fillna("").astype(str).tolist() if "新聞標題" in df.columns else [""] * len(df)
+        for i, (h, text, row_brands) in enumerate(zip(hashes, contents, brands)):
+            if h in done:
+                continue
+            if not row_brands and gate is not None and not gate.matches(titles[i] + "\n" + text):
+                methods[i] = NO_BRAND
+            else:
+                models = dictionary.resolve(text, row_brands)
+                if models is not None and not sampled(h, args.audit_rate):
+                    methods[i] = LOCAL
+                    local[h] = models
+
+    # 內容相同的文章只送一次
+    todo = {h: text for h, text, method in zip(hashes, contents, methods)
+            if method == LLM and h not in done and h not in local}
+    batches, singles = pack_batches(todo.items(), args.batch_tokens, args.batch_size)
+    print(f"共 {len(df)} 篇：無品牌略過 {methods.count(NO_BRAND)} 篇，本機字典判定 {methods.count(LOCAL)} 篇，"
+          f"checkpoint 已完成 {sum(m == LLM and h in done for h, m in zip(hashes, methods))} 篇，"
+          f"待分析 {len(todo)} 篇（{len(batches)} 個多篇請求、{len(singles)} 個單篇請求）")
+
+    client = GroqPool(GROQ_API_URL, GROQ_API_KEY, GROQ_MODEL, concurrency=args.concurrency,
+                      limiter=RateLimiter(args.rpm, args.tpm), cache=ResponseCache(args.cache))
+    fallbacks = 0
+    try:
+        # 開始分析，每完成一篇就寫入 checkpoint；格式錯誤的單篇不寫入，下次重跑會再試
+        with open(checkpoint, "a", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            def record(h, models):
+                done[h] = models
+                f.write(json.dumps({"hash": h, "models": models}, ensure_ascii=False) + "\n")
+                f.flush()
+
+            pending = {pool.submit(call_groq_batch, client, [todo[h] for h in batch]): batch for batch in batches}
+            pending.update({pool.submit(call_groq, client, todo[h]): h for h in singles})
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    item = pending.pop(future)
+                    if isinstance(item, list):
+                        results = parse_batch(future.result(), [str(i) for i in range(1, len(item) + 1)])
+                        for i, h in enumerate(item, 1):
+                            if str(i) in results:
+                                record(h, results[str(i)])
+                            else:
+                                fallbacks += 1
+                                pending[pool.submit(call_groq, client, todo[h])] = h
+                    else:
+                        models = parse_models(future.result())
+                        if models is not None:
+                            record(item, models)
+                print(f"🔍 已分析 {sum(h in done for h in todo)}/{len(todo)} 篇")
+    finally:
+        client.close()
+        client.cache.close()
+    print("API 統計：", client.stats, f"多篇回覆缺漏改單篇重送 {fallbacks} 篇")
+
+    # 加欄位
+    results = [done[h] if h in done else {} if method == NO_BRAND else local.get(h)
+               for h, method in zip(hashes, methods)]
+    df["品牌相關標籤（LLM）"] = [json.dumps(r, ensure_ascii=False) if r is not None else "" for r in results]
+    df["相關車款列表"] = [format_models(r) if r is not None else "" for r in results]
+    df[METHOD_COLUMN] = methods
+
+    # 輸出結果
+    df.to_csv(args.output, index=False, encoding="utf-8-sig")
+    print(f"✅ 已儲存結果至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# 已抓取網址紀錄（SQLite）：以正規化後的網址為 key，記錄內文 hash、ETag / Last-Modified 與抓取時間
+# 增量爬取時用來判斷哪些連結看過、提供條件式請求的驗證資訊，並給每篇文章穩定的 id
+
+import datetime
+import hashlib
+import re
+import sqlite3
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {"fbclid", "gclid", "ref"}
+ARTICLE_ID_PATTERN = re.compile(r"/news/(?:view|detail)/(\d+)")
+
+
+# 正規化網址：小寫 scheme / host、去掉追蹤參數與 #fragment、路徑結尾統一不帶斜線
+def canonical_url(url):
+    parts = urlsplit(url.strip())
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in TRACKING_PARAMS and not k.startswith("utm_")
+    )
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+
+# 穩定的文章 id：網址裡有 DDCAR 文章編號就用編號，否則取網址 hash
+def stable_id(url):
+    match = ARTICLE_ID_PATTERN.search(urlsplit(url).path)
+    if match:
+        return match.group(1)
+    return hashlib.sha1(canonical_url(url).encode("utf-8")).hexdigest()[:12]
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class SeenStore:
+    def __init__(self, db_path="ddcar_crawl.db"):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS articles (
+            url TEXT PRIMARY KEY,
+            article_id TEXT,
+            content_hash TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            fetched_at TEXT
+        )""")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+
+    def is_seen(self, url):
+        return self.conn.execute(
+            "SELECT 1 FROM articles WHERE url = ?", (canonical_url(url),)
+        ).fetchone() is not None
+
+    def get(self, url):
+        """回傳 {content_hash, etag, last_modified, fetched_at}，沒看過回傳 None。"""
+        row = self.conn.execute(
+            "SELECT content_hash, etag, last_modified, fetched_at FROM articles WHERE url = ?", (canonical_url(url),)
+        ).fetchone()
+        return dict(zip(["content_hash", "etag", "last_modified", "fetched_at"], row)) if row else None
+
+    def record(self, url, content_hash=None, etag=None, last_modified=None):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO articles (url, article_id, content_hash, etag, last_modified, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    etag = COALESCE(excluded.etag, etag),
+                    last_modified = COALESCE(excluded.last_modified, last_modified),
+                    fetched_at = excluded.fetched_at
+            """, (canonical_url(url), stable_id(url), content_hash, etag, last_modified, now))
+
+    def close(self):
+        self.conn.close()
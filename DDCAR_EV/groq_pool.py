@@ -0,0 +1,184 @@
+# Groq API 共用用戶端：連線池 + 有上限的併發 + 依 rate-limit 標頭調整的 token bucket + 以內容 hash 為 key 的回應快取
+# Groq 回應標頭：x-ratelimit-limit-tokens / remaining-tokens / reset-tokens 為每分鐘 token 數（TPM），
+# x-ratelimit-remaining-requests / reset-requests 為每日請求數（RPD）；每分鐘請求數（RPM）沒有標頭，由 rpm 參數設定
+
+import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+# 把 "1m2.5s"、"750ms" 這類重設時間轉成秒數
+def parse_duration(text):
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    parts = DURATION_PART.findall(text)
+    return sum(float(value) * units[unit] for value, unit in parts) if parts else None
+
+
+class RateLimiter:
+    """兩個 token bucket：每分鐘請求數與每分鐘 token 數。收到回應標頭時以伺服器的剩餘量為準。"""
+
+    def __init__(self, rpm=30, tpm=6000):
+        self.lock = threading.Condition()
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # 429 或每日額度用完時，在這之前都不送請求
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        return now
+
+    def acquire(self, tokens):
+        tokens = min(tokens, self.tpm)  # 單一請求超過整桶容量時，至少等到桶滿再送
+        with self.lock:
+            while True:
+                now = self._refill()
+                if now >= self.blocked_until and self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max(
+                    self.blocked_until - now,
+                    (1 - self.requests) * 60 / self.rpm,
+                    (tokens - self.tokens) * 60 / self.tpm,
+                    0.05,
+                )
+                self.lock.wait(wait)
+
+    def update(self, headers, status=200):
+        with self.lock:
+            self._refill()
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens:
+                self.tpm = max(1, int(float(limit_tokens)))
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens:
+                self.tokens = min(self.tokens, float(remaining_tokens))
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None and int(float(remaining_requests)) <= 0:
+                reset = parse_duration(headers.get("x-ratelimit-reset-requests")) or 60
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset)
+            if status == 429:
+                wait = parse_duration(headers.get("retry-after")) or \
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")) or 5
+                self.blocked_until = max(self.blocked_until, time.monotonic() + wait)
+            self.lock.notify_all()
+
+
+class ResponseCache:
+    """SQLite 回應快取，key 為模型 + 訊息內容的 sha256；多執行緒共用同一個連線。"""
+
+    def __init__(self, db_path="groq_cache.db"):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT,
+            created_at TEXT
+        )""")
+        self.conn.commit()
+
+    @staticmethod
+    def key(payload):
+        data = json.dumps([payload["model"], payload["messages"], payload.get("temperature"),
+                           payload.get("response_format")], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, response):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO responses (key, response, created_at) VALUES (?, ?, ?)",
+                              (key, response, now))
+
+    def close(self):
+        self.conn.close()
+
+
+class GroqPool:
+    """chat(messages) 回傳模型輸出文字（失敗回傳空字串）。可從多個執行緒同時呼叫，併發數由 concurrency 限制。"""
+
+    def __init__(self, url, api_key, model, concurrency=4, limiter=None, cache=None, max_retries=5,
+                 max_tokens=512, timeout=60):
+        self.url = url
+        self.model = model
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "cache_hits": 0, "rate_limited": 0, "errors": 0}
+
+    # 粗估 token 數：中文約一字一 token，再加上回應上限
+    @staticmethod
+    def estimate_tokens(payload):
+        return sum(len(m["content"]) for m in payload["messages"]) + payload["max_tokens"]
+
+    # json_mode 要求模型只輸出 JSON 物件；validate(content) 為 False 的回覆不寫入快取，下次會重新請求
+    def chat(self, messages, temperature=0.3, max_tokens=None, json_mode=False, validate=None):
+        payload = {"model": self.model, "messages": messages, "temperature": temperature,
+                   "max_tokens": max_tokens or self.max_tokens}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        key = ResponseCache.key(payload)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+
+        for attempt in range(1, self.max_retries + 1):
+            self.limiter.acquire(self.estimate_tokens(payload))
+            try:
+                with self.slots:
+                    self.stats["requests"] += 1
+                    res = self.session.post(self.url, json=payload, timeout=self.timeout)
+                self.limiter.update(res.headers, res.status_code)
+                if res.status_code == 429:
+                    self.stats["rate_limited"] += 1
+                    print(f"⏳ 第 {attempt} 次：429 限流，依 rate-limit 標頭等待後再試...")
+                    continue
+                res.raise_for_status()
+                content = res.json()["choices"][0]["message"]["content"]
+                if self.cache is not None and (validate is None or validate(content)):
+                    self.cache.put(key, content)
+                return content
+            except requests.exceptions.RequestException as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ Groq API error (嘗試 {attempt}/{self.max_retries}):", e)
+                time.sleep(min(30, 2 ** attempt))
+        return ""
+
+    def close(self):
+        self.session.close()
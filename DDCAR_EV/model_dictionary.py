@@ -0,0 +1,78 @@
+# 本機車款字典：從先前 LLM 的分析結果（{品牌: [車款]}）整理出「車款 -> 品牌」，用來在送 LLM 前直接判定明確的文章
+# 比對沿用 brand_matcher 的 Aho-Corasick 與字界規則；車款要在先前結果中出現至少 min_count 次才收錄，避免 LLM 偶發的錯字
+# 只有「文章中找到的車款所屬品牌」剛好等於「品牌欄位標記的品牌」，且品牌或已知車款附近沒有字典以外的英數字詞
+# （可能是新車款，例如「Model Y 與全新 Cybercab」的 Cybercab）時才算明確，其餘交給 LLM
+# 中文車名的新車款（例如「海豹」）無法這樣偵測，由 ddcar_related_terms.py 的抽樣送審補足
+
+import re
+from collections import Counter, defaultdict
+
+from brand_matcher import BRAND_MAP, BrandMatcher, _normalize
+
+LATIN_TOKEN = re.compile(r"[a-z0-9][a-z0-9.+-]*[a-z0-9+]|[a-z]")
+# 新聞裡常見、不是車款的英文縮寫與單位
+COMMON_TOKENS = frozenset(["km", "kwh", "kw", "hp", "ps", "nm", "nt", "usd", "ev", "evs", "suv", "mpv", "phev", "hev",
+                           "bev", "ai", "ota", "adas", "ccs", "ccs1", "ccs2", "nacs", "ncap", "eu", "us"])
+
+
+class ModelDictionary:
+    def __init__(self, records=(), min_count=2, window=20):
+        self.window = window  # 品牌或車款前後幾個字內出現未知英數字詞就不算明確
+        self.brand_matcher = BrandMatcher(BRAND_MAP)
+        spellings = defaultdict(Counter)  # 車款 key -> 各種寫法出現次數
+        brands = defaultdict(Counter)  # 車款 key -> 品牌名稱出現次數
+        for record in records:
+            for brand, models in record.items():
+                for model in models:
+                    key = model.strip().lower()
+                    if len(key) < 2:
+                        continue
+                    spellings[key][model.strip()] += 1
+                    brands[key][brand] += 1
+        self.models = {}  # 車款寫法 -> (品牌名稱, BRAND_MAP 的品牌或 None)
+        for key, counter in spellings.items():
+            if sum(counter.values()) < min_count:
+                continue
+            brand = brands[key].most_common(1)[0][0]
+            self.models[counter.most_common(1)[0][0]] = (brand, self.brand_key(brand))
+        self.names = list(self.models)
+        self.matcher = BrandMatcher({name: [name] for name in self.names}) if self.names else None
+
+    def __len__(self):
+        return len(self.models)
+
+    # LLM 回覆的品牌名稱（Tesla、特斯拉、Mercedes-Benz…）對應到 BRAND_MAP 的品牌
+    def brand_key(self, brand):
+        matches = self.brand_matcher.matches(brand)
+        return self.brand_matcher.brands[matches[0][2]] if matches else None
+
+    # 品牌或已知車款附近是否有字典以外的英數字詞（純數字、常見縮寫與單位、品牌別名與已知車款本身不算）
+    def _unknown_nearby(self, text, model_spans):
+        normalized = _normalize(text)
+        known = model_spans + self.brand_matcher.matches(text)
+        for match in LATIN_TOKEN.finditer(normalized):
+            start, end = match.start(), match.end() - 1
+            if match.group().isdigit() or match.group() in COMMON_TOKENS or any(s <= start and end <= e for s, e, _ in known):
+                continue
+            if any(start - self.window <= e and s - self.window <= end for s, e, _ in known):
+                return True
+        return False
+
+    def resolve(self, text, mentioned):
+        """mentioned 為文章標記的品牌集合。明確時回傳 {品牌: [車款]}，否則回傳 None。"""
+        if self.matcher is None or not mentioned:
+            return None
+        found = {}
+        keys = set()
+        spans = self.matcher.matches(text)
+        for _, _, index in spans:
+            name = self.names[index]
+            brand, key = self.models[name]
+            if key is None:
+                return None
+            keys.add(key)
+            if name not in found.setdefault(brand, []):
+                found[brand].append(name)
+        if keys != set(mentioned) or self._unknown_nearby(text, spans):
+            return None
+        return found
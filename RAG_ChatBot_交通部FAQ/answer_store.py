@@ -0,0 +1,51 @@
+# FAQ 欄位的記憶體映射儲存：每欄一個 UTF-8 串接檔加上一個 offsets 陣列，依列號延遲讀取
+# 取代 app.py 啟動時整份載入的 faq_data.csv 與 faq_texts.pkl，多個 worker 共用 OS page cache
+
+import json
+import mmap
+from pathlib import Path
+
+import numpy as np
+
+COLUMN_FILES = {"問題": "question", "答覆": "answer"}
+
+
+def write_store(df, directory, columns=COLUMN_FILES):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for column, stem in columns.items():
+        encoded = [str(value).encode("utf-8") if value == value else b"" for value in df[column]]
+        offsets = np.zeros(len(encoded) + 1, dtype="int64")
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        (directory / f"{stem}.bin").write_bytes(b"".join(encoded))
+        np.save(directory / f"{stem}.offsets.npy", offsets)
+    manifest = {"rows": len(df), "columns": dict(columns)}
+    (directory / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+
+
+class AnswerStore:
+    """唯讀的 FAQ 欄位儲存，get(row_id, 欄位) 只讀出該列的位元組。"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        manifest = json.loads((self.directory / "manifest.json").read_text(encoding="utf-8"))
+        self.rows = manifest["rows"]
+        self.columns = manifest["columns"]
+        self.opened = {}
+
+    def __len__(self):
+        return self.rows
+
+    def get(self, row_id, column):
+        data, offsets = self._open(column)
+        start, end = int(offsets[row_id]), int(offsets[row_id + 1])
+        return data[start:end].decode("utf-8")
+
+    def _open(self, column):
+        if column not in self.opened:
+            stem = self.columns[column]
+            offsets = np.load(self.directory / f"{stem}.offsets.npy", mmap_mode="r")
+            with open(self.directory / f"{stem}.bin", "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if offsets[-1] else b""
+            self.opened[column] = (data, offsets)
+        return self.opened[column]
@@ -2,32 +2,174 @@ import pandas as pd
 import numpy as np
 import faiss
 import gradio as gr
-import pickle
-from sentence_transformers import SentenceTransformer
-from groq import Groq
+from groq import Groq, AsyncGroq, DefaultHttpxClient, DefaultAsyncHttpxClient
 import sqlite3
-import csv
 import datetime
-from pathlib import Path
 import os
+import re
+import atexit
+import asyncio
+import logging
+import threading
+import time
+import resource
+from contextlib import contextmanager
+from pathlib import Path
 from dotenv import load_dotenv
+from rag_cache import QueryEmbeddingCache, AnswerCache
+from fake_llm import FakeGroqClient, AsyncFakeGroqClient
+from embedding_batcher import MicroBatchEncoder
+from feedback_worker import FeedbackPipeline
+from feedback_queries import ensure_schema
+from retrieval import Retriever, load_reranker
+from bm25_index import BM25Index
+from index_factory import load_index
+from answer_store import AnswerStore, write_store
+from embedding_backend import backend_id, current_backend, load_encoder
+import metrics
+from metrics import registry
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"  # 避免tokenizers錯誤
+logging.basicConfig(level=logging.INFO)
+load_dotenv()  # 會自動讀取 .env
+startup_begin = time.perf_counter()
+logger = logging.getLogger("app")
+
+
+# 目前常駐記憶體（MB），讀不到 /proc 時改用峰值
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
 
 # 初始化與載入
-df = pd.read_csv("faq_data.csv")  # FAQ的原始資料（問題、答案）
-with open("faq_texts.pkl", "rb") as f:
-    faq_texts = pickle.load(f)  # 結合過的文字語料，用於查詢比對
-index = faiss.read_index("faq.index")  # FAISS 建立的語意查詢資料庫
-model = SentenceTransformer("BAAI/bge-large-zh")  # hugguing face上的將文字轉向量的中文語意模型
+# FAQ 問題／答覆改用 main.py 產生的 faq_store/，依列號以 mmap 讀取；舊資料夾沒有時從 faq_data.csv 轉一次
+if not Path("faq_store/manifest.json").exists():
+    write_store(pd.read_csv("faq_data.csv"), "faq_store")
+faq_store = AnswerStore("faq_store")
+# FAISS 建立的語意查詢資料庫，類型由 main.py 寫入的 faq.index.meta.json 決定；nprobe / efSearch 可調
+# INDEX_MMAP=1（預設）時以記憶體映射開啟，多個 worker 共用同一份頁面
+INDEX_IO_FLAGS = 0
+if os.getenv("INDEX_MMAP", "1") == "1":
+    INDEX_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+def open_index(io_flags):
+    return load_index(
+        "faq.index",
+        nprobe=int(os.getenv("INDEX_NPROBE", "16")),
+        ef_search=int(os.getenv("INDEX_EF_SEARCH", "64")),
+        io_flags=io_flags
+    )
+
+try:
+    index, index_meta = open_index(INDEX_IO_FLAGS)
+except RuntimeError:
+    logger.warning("此索引類型無法以 mmap 開啟，改為整份載入")
+    index, index_meta = open_index(0)
+
+# 查詢向量必須與建索引時使用同一個嵌入後端（EMBED_BACKEND：torch / small / onnx-int8）
+EMBED_BACKEND = current_backend()
+if index_meta.get("model", "BAAI/bge-large-zh") != backend_id(EMBED_BACKEND):
+    raise RuntimeError(
+        f"faq.index 是以 {index_meta.get('model')} 建立，與 EMBED_BACKEND={EMBED_BACKEND} 不符，請重跑 main.py"
+    )
+
+# hugguing face上的將文字轉向量的中文語意模型，延後到第一次使用才載入
+# MODEL_WARMUP: background（預設，啟動後在背景載入）/ lazy（第一次查詢才載入）/ eager（啟動時載入）
+model = None
+model_lock = threading.Lock()
+
+def get_model():
+    global model
+    with model_lock:
+        if model is None:
+            start = time.perf_counter()
+            model = load_encoder(EMBED_BACKEND)
+            logger.info("模型載入完成：%.2f 秒，RSS %.0f MB", time.perf_counter() - start, current_rss_mb())
+        return model
+
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+if MODEL_WARMUP == "eager":
+    get_model()
+elif MODEL_WARMUP == "background":
+    threading.Thread(target=get_model, name="model-warmup", daemon=True).start()
 # 初始化 Groq API
-load_dotenv()  # 會自動讀取 .env
 GROQ_API_KEY = os.getenv("API_KEY")  # 取得變數
-client = Groq(api_key=GROQ_API_KEY)  # 用來發送LLM請求（Groq API）
+# 用來發送LLM請求（Groq API）；LLM_BACKEND=fake 時改用本機假 LLM（測試用）
+# 問答用 async client（共用連線池，等待回應時不佔用執行緒），背景分類仍用同步 client
+if os.getenv("LLM_BACKEND", "groq") == "fake":
+    fake_delays = dict(
+        first_token_delay=float(os.getenv("FAKE_LLM_FIRST_TOKEN_DELAY", "0.3")),
+        token_delay=float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.02"))
+    )
+    client = FakeGroqClient(**fake_delays)
+    async_client = AsyncFakeGroqClient(**fake_delays)
+else:
+    # 每個 HTTP 回應依狀態碼計數，SDK 內建的重試（429 / 5xx）也會算進去
+    def count_groq_response(response):
+        registry.inc("rag_groq_http_responses_total", status=response.status_code)
+
+    async def count_groq_response_async(response):
+        count_groq_response(response)
+
+    client = Groq(
+        api_key=GROQ_API_KEY,
+        http_client=DefaultHttpxClient(event_hooks={"response": [count_groq_response]})
+    )
+    async_client = AsyncGroq(
+        api_key=GROQ_API_KEY,
+        http_client=DefaultAsyncHttpxClient(event_hooks={"response": [count_groq_response_async]})
+    )
+STREAM_ANSWER = os.getenv("STREAM_ANSWER", "1") == "1"  # 逐字串流回覆到對話框
+
+# 查詢向量快取：常見問題重複出現時不必再跑一次模型（QUERY_CACHE_DB 設為空字串則只用記憶體）
+query_cache = QueryEmbeddingCache(
+    max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+    db_path=os.getenv("QUERY_CACHE_DB", "query_cache.db") or None,
+    model=backend_id(EMBED_BACKEND)  # 換 EMBED_BACKEND 時清掉舊後端的向量
+)
+# LLM 改寫答案快取：同一筆 FAQ、相近問題直接回傳先前的改寫結果（ANSWER_CACHE_MODE: off / exact / semantic）
+answer_cache = AnswerCache(
+    mode=os.getenv("ANSWER_CACHE_MODE", "semantic"),
+    threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+    ttl=int(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", "2048"))
+)
+# 檢索：取前 k 筆候選重新排序，距離超過門檻就直接回覆客服專線，不呼叫 LLM
+retriever = Retriever(
+    index,
+    lambda row_id: faq_store.get(row_id, "問題"),
+    top_k=int(os.getenv("RETRIEVAL_TOP_K", "5")),
+    max_distance=float(os.getenv("RETRIEVAL_MAX_DISTANCE", "0.6")),
+    lexical_weight=float(os.getenv("RETRIEVAL_LEXICAL_WEIGHT", "0.3")),
+    reranker=load_reranker(os.getenv("RERANKER_MODEL")),
+    # main.py 產生的 BM25 索引；有的話與向量結果融合，並可在詞面高度命中時略過向量模型
+    lexical_index=BM25Index.load("faq_bm25.npz") if Path("faq_bm25.npz").exists() else None,
+    lexical_min_coverage=float(os.getenv("LEXICAL_MIN_COVERAGE", "0.6")),
+    fast_path_coverage=float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "0.9")),
+    fast_path_margin=float(os.getenv("LEXICAL_FAST_PATH_MARGIN", "2.0")),
+    fast_path_min_terms=int(os.getenv("LEXICAL_FAST_PATH_MIN_TERMS", "3"))
+)
+# 指標：/metrics 端點（METRICS_HOST:METRICS_PORT，埠為 0 時關閉）與定期寫入 feedback.db 的 metrics 表
+# （保留 METRICS_RETENTION_DAYS 天），由 start_background 啟動
+registry.gauge("rag_cache_hit_rate", lambda: {
+    (("cache", "query"),): query_cache.stats()["hit_rate"],
+    (("cache", "answer"),): answer_cache.stats()["hit_rate"],
+})
+
+CONTEXT_ANSWERS = int(os.getenv("RETRIEVAL_CONTEXT_ANSWERS", "2"))  # 除最佳答案外，一併提供給 LLM 的參考答案數
+FALLBACK_ANSWER = "對不起，您問的問題我目前無法回答，詳情請洽交通部客服專線詢問：0800-231-161。"
 
 # 初始化 SQLite 資料庫（如不存在則創建）
 def init_db():
     conn = sqlite3.connect("feedback.db")
+    conn.execute("PRAGMA journal_mode=WAL")
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS feedback (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,6 +181,7 @@ def init_db():
         topic TEXT
     )''')
     conn.commit()
+    ensure_schema(conn)  # dashboard 查詢用的索引與全文檢索表
     conn.close()
 
 init_db()
@@ -46,40 +189,114 @@ init_db()
 
 # 嵌入與回答
 def embed(texts):
-    return model.encode(
+    return get_model().encode(
         [f"為這句話生成表示以用於檢索: {t}" for t in texts],
         normalize_embeddings=True
     )
 
-def rephrase_answer(question, original_answer, chat_history):
+# 同時間的查詢向量請求合併成一次 encode（最多 EMBED_MAX_BATCH 筆或等 EMBED_MAX_WAIT_MS 毫秒）
+embed_batcher = MicroBatchEncoder(
+    embed,
+    max_batch=int(os.getenv("EMBED_MAX_BATCH", "32")),
+    max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "10"))
+)
+
+# 單一問題的向量，先查快取
+def embed_query(text):
+    return query_cache.get_or_compute(text, embed_batcher.encode_one)
+
+# LLM 呼叫的耗時與錯誤計數
+@contextmanager
+def track_llm(call):
+    with registry.timer(call):
+        try:
+            yield
+        except Exception as e:
+            registry.inc("rag_llm_errors_total", call=call, error=type(e).__name__)
+            raise
+
+# 串流回應：只累計等待 LLM 送出下一段的時間，不含呼叫端（UI）處理每一段的時間，結束時記一筆耗時
+async def track_stream(call, stream):
+    waited = 0.0
+    chunks = stream.__aiter__()
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            break
+        except Exception as e:
+            registry.inc("rag_llm_errors_total", call=call, error=type(e).__name__)
+            raise
+        finally:
+            waited += time.perf_counter() - start
+        yield chunk
+    registry.observe("rag_stage_seconds", waited, stage=call)
+
+# 只記 API 回報的 usage；串流時 Groq 在最後一段的 x_groq.usage 附上用量
+def count_tokens(call, usage):
+    if getattr(usage, "completion_tokens", None):
+        registry.inc("rag_llm_tokens_total", usage.completion_tokens, call=call)
+
+# 多輪對話的背景：最近兩個問題
+def history_context(chat_history):
+    return "。".join([q for q, _ in chat_history[-2:]])
+
+async def rephrase_answer(question, original_answer, chat_history, reference_answers=()):
     system_prompt = (
     "你是交通部的 AI 語言助理，請使用繁體中文，以自然、親切、專業的方式回覆民眾。"
     "請根據下方提供的原始回答進行重寫，使其更易懂、更自然。"
     "在回答中，如果與民眾意見反映或建議有關，請引導他們前往部長信箱：https://poms.motc.gov.tw/Daoan/tw。"
     "所有回答必須使用繁體中文，不得出現『使用者：』或『AI：』等格式。"
     "如果你無法回答問題，請說："
-    "「對不起，您問的問題我目前無法回答，詳情請洽交通部客服專線詢問：0800-231-161。」"
+    f"「{FALLBACK_ANSWER}」"
     )
 
 
-    context = "。".join([q for q, _ in chat_history[-2:]])
+    context = history_context(chat_history)
     user_prompt = (
         f"問題背景：{context}\n\n"
         f"原始回答：{original_answer}\n\n"
-        f"請重新表達這段內容，使其自然易懂。"
-    )
-
-    response = client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=512
     )
-
-    return response.choices[0].message.content.strip()
+    if reference_answers:
+        references = "\n".join(f"- {a}" for a in reference_answers)
+        user_prompt += f"其他可能相關的參考答案（僅在與問題相關時使用）：\n{references}\n\n"
+    user_prompt += "請重新表達這段內容，使其自然易懂。"
+
+    # 串流時 llm_rephrase 為收到回應開頭的時間，llm_rephrase_stream 為之後產生內容的時間
+    with track_llm("llm_rephrase"):
+        response = await async_client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.7,
+            max_tokens=512,
+            stream=STREAM_ANSWER
+        )
+
+    # 產生器：每收到新的 token 就回傳目前累積的回答
+    if not STREAM_ANSWER:
+        count_tokens("rephrase", getattr(response, "usage", None))
+        yield response.choices[0].message.content.strip()
+        return
+    partial = ""
+    chunks = 0
+    usage = None
+    async for chunk in track_stream("llm_rephrase_stream", response):
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or usage
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            chunks += 1
+            partial += delta
+            yield partial.lstrip()
+    # 沒有 usage 時（例如 fake_llm）只記收到的片段數，不當成 token 數
+    if usage is not None:
+        count_tokens("rephrase", usage)
+    else:
+        registry.inc("rag_llm_stream_chunks_total", chunks, call="rephrase")
+    yield partial.strip()
 
 # LLM問題自動分類
 def classify_topic_with_llm(question):
@@ -91,62 +308,126 @@ def classify_topic_with_llm(question):
     )
     user_prompt = f"問題內容：{question}\n請回覆對應主題："
 
-    response = client.chat.completions.create(
-        model="llama3-8b-8192",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0,
-        max_tokens=20
-    )
+    with track_llm("classify"):
+        response = client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0,
+            max_tokens=20
+        )
+    count_tokens("classify", getattr(response, "usage", None))
     return response.choices[0].message.content.strip()
 
+TOPICS = ["交通違規", "大眾運輸", "道路建設", "政策建議", "其他"]
+
+# 一次分類多個問題；回覆格式不對時退回逐題分類
+def classify_topics_with_llm(questions):
+    if len(questions) == 1:
+        return [classify_topic_with_llm(questions[0])]
+    system_prompt = (
+        "你是交通部的內部客服資料分類員，請協助將民眾的問題依照主題分類。"
+        "每個問題都請從下列五個主題中選擇最符合的分類："
+        "交通違規、大眾運輸、道路建設、政策建議、其他。"
+        "請依題號逐行回覆，格式為「題號. 類別」，不要加上多餘說明。"
+    )
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+    with track_llm("classify_batch"):
+        response = client.chat.completions.create(
+            model="llama3-8b-8192",
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"問題內容：\n{numbered}\n請回覆對應主題："}
+            ],
+            temperature=0,
+            max_tokens=20 * len(questions)
+        )
+    count_tokens("classify", getattr(response, "usage", None))
+    topics = {}
+    for line in response.choices[0].message.content.splitlines():
+        match = re.match(r"\s*(\d+)[.、:：)]\s*(\S+)", line)
+        if match and match.group(2) in TOPICS:
+            topics[int(match.group(1))] = match.group(2)
+    if len(topics) != len(questions) or set(topics) != set(range(1, len(questions) + 1)):
+        return [classify_topic_with_llm(q) for q in questions]
+    return [topics[i] for i in range(1, len(questions) + 1)]
+
+# 回饋當下寫進 feedback.db，主題分類由背景執行緒批次處理，使用者不必等 LLM（執行緒由 start_background 啟動）
+feedback_pipeline = FeedbackPipeline(
+    "feedback.db",
+    classify_topics_with_llm,
+    batch_size=int(os.getenv("FEEDBACK_BATCH_SIZE", "20")),
+    max_wait=float(os.getenv("FEEDBACK_MAX_WAIT", "1.0"))
+)
+
+
+# 會動到正式資料或佔用連接埠的背景服務：回饋分類 worker（含啟動時補分類）、/metrics 端點與指標寫入 feedback.db
+# 只在直接執行 app.py 時啟動；benchmark.py、load_test.py 等匯入 app 時不會碰到正式的 feedback.db 與 9464 埠
+def start_background():
+    feedback_pipeline.start()
+    atexit.register(feedback_pipeline.close)
+    atexit.register(feedback_pipeline.flush)  # atexit 後註冊先執行：先處理完佇列再關連線
+    if int(os.getenv("METRICS_PORT", "9464")):
+        metrics.start_http_server(int(os.getenv("METRICS_PORT", "9464")), host=os.getenv("METRICS_HOST", "127.0.0.1"))
+    retention_days = float(os.getenv("METRICS_RETENTION_DAYS", "14"))
+    metrics.start_db_writer("feedback.db", interval=int(os.getenv("METRICS_FLUSH_SECONDS", "60")),
+                            retention_days=retention_days)
+    atexit.register(metrics.flush_to_db, "feedback.db", retention_days=retention_days)
+
 
 # 查詢流程
-def answer_question(user_input, chat_history):
-    query_vector = embed([user_input])[0].astype("float32").reshape(1, -1)
-    D, I = index.search(query_vector, k=1)
-    original_answer = df.iloc[I[0][0]]['答覆']
-    rewritten = rephrase_answer(user_input, original_answer, chat_history)
-    chat_history.append((user_input, rewritten))
-    return chat_history, chat_history, rewritten, ""
+async def answer_question(user_input, chat_history):
+    started = time.perf_counter()
+    with registry.timer("embed"):
+        query_vector = await asyncio.to_thread(embed_query, user_input)
+    # 詞面完全命中且通過向量距離門檻時，retrieve 直接回傳該筆，不做融合與重新排序
+    with registry.timer("search"):
+        candidates = await asyncio.to_thread(retriever.retrieve, user_input, query_vector)
+    if candidates and candidates[0].fast_path:
+        registry.inc("rag_lexical_fast_path_total")
+    if not candidates:
+        registry.inc("rag_answers_total", path="fallback")
+        chat_history.append((user_input, FALLBACK_ANSWER))
+        yield chat_history, chat_history, FALLBACK_ANSWER, ""
+        return
+    row_id = candidates[0].row_id
+    original_answer = faq_store.get(row_id, "答覆")
+    reference_answers = [faq_store.get(c.row_id, "答覆") for c in candidates[1:1 + CONTEXT_ANSWERS]]
+    context = history_context(chat_history)
+    cached = answer_cache.lookup(row_id, user_input, context, query_vector)
+    if cached is not None:
+        registry.inc("rag_answers_total", path="cache")
+        chat_history.append((user_input, cached))
+        yield chat_history, chat_history, cached, ""
+        return
+
+    # 檢索完成就先顯示問題，之後邊收 token 邊更新對話框
+    history = list(chat_history)
+    chat_history.append((user_input, ""))
+    yield chat_history, chat_history, "", ""
+    registry.inc("rag_answers_total", path="llm")
+    rewritten = ""
+    async for rewritten in rephrase_answer(user_input, original_answer, history, reference_answers):
+        if not chat_history[-1][1] and rewritten:
+            registry.observe("rag_stage_seconds", time.perf_counter() - started, stage="first_token")
+        chat_history[-1] = (user_input, rewritten)
+        yield chat_history, chat_history, rewritten, ""
+    registry.observe("rag_stage_seconds", time.perf_counter() - started, stage="answer_total")
+    answer_cache.store(row_id, user_input, context, query_vector, rewritten)
 
 # 問答回饋紀錄
 def record_feedback(chat_history, helpful, report_text):
     timestamp = datetime.datetime.now().isoformat()
     last_q, last_a = chat_history[-1]
-    topic = classify_topic_with_llm(last_q)
-
-    # 寫入 TXT（可選）
-    log = (
-        f"[{timestamp}]\n"
-        f"Q: {last_q}\n"
-        f"A: {last_a}\n"
-        f"👍Helpful: {helpful}\n"
-        f"🐞Report: {report_text}\n\n"
-    )
-    with open("feedback_log.txt", "a", encoding="utf-8") as f:
-        f.write(log)
-
-    # 寫入 CSV
-    csv_file = Path("feedback_log.csv")
-    file_exists = csv_file.exists()
-    with open(csv_file, mode="a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["時間", "問題", "回答", "滿意與否", "錯誤補充", "主題分類"])
-        writer.writerow([timestamp, last_q, last_a, helpful, report_text, topic])
-
-    # 寫入 SQLite
-    conn = sqlite3.connect("feedback.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO feedback (time, question, answer, helpful, report, topic)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (timestamp, last_q, last_a, helpful, report_text, topic))
-    conn.commit()
-    conn.close()
+    feedback_pipeline.submit({
+        "time": timestamp,
+        "question": last_q,
+        "answer": last_a,
+        "helpful": helpful,
+        "report": report_text
+    })
 
     # 回傳空歷史 → 重設多輪對話
     return [], [], "✅ 感謝您的回饋，我們已記錄。"
@@ -191,5 +472,15 @@ with gr.Blocks() as demo:
         outputs=[chat_state, chat_display, feedback_msg]
     )
 
-
-demo.launch()
+logger.info(
+    "啟動完成：%.2f 秒，RSS %.0f MB（INDEX_MMAP=%s，MODEL_WARMUP=%s）",
+    time.perf_counter() - startup_begin, current_rss_mb(), os.getenv("INDEX_MMAP", "1"), MODEL_WARMUP
+)
+
+if __name__ == "__main__":
+    start_background()
+    # 請求排隊，同時處理的問題數上限為 CONCURRENCY_LIMIT，排隊超過 QUEUE_MAX_SIZE 則拒絕
+    demo.queue(
+        default_concurrency_limit=int(os.getenv("CONCURRENCY_LIMIT", "16")),
+        max_size=int(os.getenv("QUEUE_MAX_SIZE", "128"))
+    ).launch()
@@ -0,0 +1,222 @@
+# 端到端 RAG 延遲基準測試：以 faq_data.csv 產生的問題（含改寫與雜訊）走完 嵌入 → 檢索 → LLM 改寫 → 回饋寫入
+# LLM 連到本機假 Groq 伺服器（fake_groq_server.py），延遲可調；結果存成 JSON 方便跨 commit 比較
+# 用法：python benchmark.py --variants 3 --concurrency 1 8 32 --output benchmarks/
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from fake_groq_server import start_server
+
+TEMPLATES = ["{q}", "請問{q}", "我想知道{q}", "{q}要怎麼辦？", "想請教一下，{q}", "{q}嗎"]
+NOISE_CHARS = "的了嗎呢啊，。 "
+
+
+# 問題變體：套用口語樣板，再隨機刪字或插入贅字，模擬民眾的實際輸入
+def make_variants(question, n, rng):
+    question = question.replace("詢問", "").strip("。？? ")
+    variants = [question]
+    for _ in range(n - 1):
+        text = rng.choice(TEMPLATES).format(q=question)
+        chars = list(text)
+        for _ in range(rng.randint(0, 2)):
+            pos = rng.randrange(len(chars))
+            if rng.random() < 0.5 and len(chars) > 4:
+                del chars[pos]
+            else:
+                chars.insert(pos, rng.choice(NOISE_CHARS))
+        variants.append("".join(chars))
+    return variants
+
+
+def summarize(values):
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values) * 1000
+    return {
+        "n": len(values),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def time_llm(app, question, answer):
+    start = time.perf_counter()
+    first = None
+    async for partial in app.rephrase_answer(question, answer, []):
+        if partial and first is None:
+            first = time.perf_counter() - start
+    return time.perf_counter() - start, first or 0.0
+
+
+# 逐題量測各階段延遲與 top-1 正確率
+async def run_stages(app, corpus):
+    stages = {"embed": [], "search": [], "llm": [], "llm_first_token": []}
+    correct = fallback = 0
+    for question, truth in corpus:
+        start = time.perf_counter()
+        vector = app.embed_query(question).reshape(1, -1)
+        stages["embed"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        candidates = app.retriever.retrieve(question, vector)
+        stages["search"].append(time.perf_counter() - start)
+
+        if not candidates:
+            fallback += 1
+            continue
+        correct += candidates[0].row_id == truth
+        total, first = await time_llm(app, question, app.faq_store.get(candidates[0].row_id, "答覆"))
+        stages["llm"].append(total)
+        stages["llm_first_token"].append(first)
+    return stages, correct / len(corpus), fallback / len(corpus)
+
+
+# 回饋寫入：在暫存資料庫上跑背景 worker 的批次處理，分開量測主題分類（LLM）與資料庫寫入
+def run_feedback_batches(app, corpus, batch_size):
+    from feedback_worker import FeedbackPipeline
+
+    classify_times = []
+
+    def classify(questions):
+        start = time.perf_counter()
+        try:
+            return app.classify_topics_with_llm(questions)
+        finally:
+            classify_times.append(time.perf_counter() - start)
+
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        db = tmp / "feedback.db"
+        shutil.copy("feedback.db", db)
+        pipeline = FeedbackPipeline(str(db), classify, txt_path=str(tmp / "log.txt"),
+                                    csv_path=str(tmp / "log.csv"), batch_size=batch_size)
+        events = [{"time": datetime.datetime.now().isoformat(), "question": q, "answer": "", "helpful": "是",
+                   "report": ""} for q, _ in corpus]
+        totals = []
+        for start in range(0, len(events), batch_size):
+            t = time.perf_counter()
+            pipeline._process([(pipeline.insert(e), e) for e in events[start:start + batch_size]])
+            totals.append(time.perf_counter() - t)
+        return classify_times, [total - c for total, c in zip(totals, classify_times)]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+async def run_concurrency(app, questions, users, per_user):
+    latencies = []
+
+    async def user(rng):
+        for _ in range(per_user):
+            start = time.perf_counter()
+            async for _ in app.answer_question(rng.choice(questions), []):
+                pass
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[user(random.Random(i)) for i in range(users)])
+    elapsed = time.perf_counter() - start
+    return dict(users=users, throughput_qps=len(latencies) / elapsed, **summarize(latencies))
+
+
+def run_index_builds(dim, sizes):
+    import index_factory
+
+    results = []
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        vectors = rng.standard_normal((n, dim)).astype("float32")
+        start = time.perf_counter()
+        index_factory.build_index("flat", vectors, np.arange(n))
+        results.append({"rows": n, "build_s": time.perf_counter() - start})
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="RAG 端到端延遲基準測試")
+    parser.add_argument("--variants", type=int, default=3, help="每題產生的問題變體數")
+    parser.add_argument("--limit", type=int, default=0, help="只取前 N 題 FAQ（0 為全部）")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="假 LLM 首個 token 延遲（秒）")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="假 LLM 每個 token 間隔（秒）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--per-user", type=int, default=5)
+    parser.add_argument("--feedback-batch", type=int, default=20)
+    parser.add_argument("--build-sizes", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmarks", help="JSON 輸出資料夾")
+    args = parser.parse_args()
+
+    server = start_server(0, args.first_token_delay, args.token_delay)
+    os.environ.update({
+        "LLM_BACKEND": "groq",
+        "GROQ_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}",
+        "API_KEY": os.getenv("API_KEY") or "benchmark",
+        "ANSWER_CACHE_MODE": "off",
+        "QUERY_CACHE_SIZE": "0",
+        "QUERY_CACHE_DB": "",
+        "MODEL_WARMUP": "eager",
+    })
+    import app
+
+    rng = random.Random(args.seed)
+    rows = range(len(app.faq_store)) if not args.limit else range(min(args.limit, len(app.faq_store)))
+    corpus = [(v, i) for i in rows for v in make_variants(app.faq_store.get(i, "問題"), args.variants, rng)]
+    print(f"問題語料：{len(corpus)} 題（{len(rows)} 筆 FAQ × {args.variants} 種變體）")
+
+    stages, accuracy, fallback_rate = await run_stages(app, corpus)
+    stages["classify_batch"], stages["db_write_batch"] = run_feedback_batches(app, corpus, args.feedback_batch)
+    concurrency = [await run_concurrency(app, [q for q, _ in corpus], users, args.per_user)
+                   for users in args.concurrency]
+    builds = run_index_builds(app.index.d, args.build_sizes)
+
+    result = {
+        "commit": git_commit(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args) | {"embed_backend": app.EMBED_BACKEND, "index": app.index_meta},
+        "questions": len(corpus),
+        "top1_accuracy": accuracy,
+        "fallback_rate": fallback_rate,
+        "stages": {name: summarize(values) for name, values in stages.items()},
+        "concurrency": concurrency,
+        "index_builds": builds,
+    }
+
+    print(f"top-1 正確率：{accuracy:.3f}，直接轉客服比例：{fallback_rate:.3f}")
+    print(f"{'階段':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in result["stages"].items():
+        if s["n"]:
+            print(f"{name:<18}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}")
+    print(f"{'併發':<8}{'q/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for c in concurrency:
+        print(f"{c['users']:<8}{c['throughput_qps']:>10.2f}{c['p50_ms']:>10.1f}{c['p95_ms']:>10.1f}{c['p99_ms']:>10.1f}")
+    for b in builds:
+        print(f"索引建置 {b['rows']} 筆：{b['build_s']:.2f} 秒")
+
+    out_dir = Path(args.output)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"bench-{result['commit'] or 'local'}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    out_path.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"已儲存 {out_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
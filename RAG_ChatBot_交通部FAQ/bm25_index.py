@@ -0,0 +1,137 @@
+# 中文 BM25 倒排索引：main.py 建立並存成 faq_bm25.npz，app.py 查詢時與 FAISS 結果做 RRF 融合
+# 斷詞預設為「英數字整段 + 中文字元 bigram」，可改用 jieba（需另外安裝）
+
+import re
+import unicodedata
+
+import numpy as np
+
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[一-鿿]+")
+
+
+# 英數字（路線編號、電話、車牌、法條號碼）整段保留，中文切成字元 bigram
+def char_tokenize(text):
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize("NFKC", str(text)).lower()):
+        run = match.group()
+        if run[0].isascii():
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def jieba_tokenize(text):
+    if jieba is None:
+        raise ImportError("使用 jieba 斷詞需先安裝：pip install jieba")
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    return [t for t in jieba.cut_for_search(text) if TOKEN_PATTERN.fullmatch(t)]
+
+
+TOKENIZERS = {"char": char_tokenize, "jieba": jieba_tokenize}
+
+
+class BM25Index:
+    """以 CSR 陣列儲存的倒排索引：每個詞一段 (文件編號, 詞頻) posting list。"""
+
+    def __init__(self, terms, indptr, doc_ids, tfs, doc_len, tokenizer="char", k1=1.5, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.tokenizer = tokenizer
+        self.tokenize = TOKENIZERS[tokenizer]
+        self.k1 = k1
+        self.b = b
+        n = len(doc_len)
+        df = np.diff(indptr)
+        self.idf = np.log(1 + (n - df + 0.5) / (df + 0.5)).astype("float32")
+        self.max_idf = float(np.log(1 + (n + 0.5) / 0.5))  # 沒出現過的詞
+        self.norm = (k1 * (1 - b + b * doc_len / max(doc_len.mean(), 1))).astype("float32")
+
+    @classmethod
+    def build(cls, texts, tokenizer="char"):
+        tokenize = TOKENIZERS[tokenizer]
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype="float32")
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype="int64")
+        indptr[1:] = np.cumsum([len(postings[t]) for t in terms])
+        doc_ids = np.array([d for t in terms for d, _ in postings[t]], dtype="int32")
+        tfs = np.array([min(tf, 65535) for t in terms for _, tf in postings[t]], dtype="uint16")
+        return cls(terms, indptr, doc_ids, tfs, doc_len, tokenizer)
+
+    def save(self, path):
+        terms = sorted(self.vocab, key=self.vocab.get)
+        np.savez_compressed(
+            path, terms=np.array(terms), indptr=self.indptr, doc_ids=self.doc_ids, tfs=self.tfs,
+            doc_len=self.doc_len, tokenizer=np.array(self.tokenizer)
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(data["terms"].tolist(), data["indptr"], data["doc_ids"], data["tfs"], data["doc_len"],
+                   str(data["tokenizer"]))
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def scores(self, query):
+        """回傳 (每份文件的 BM25 分數, 每份文件命中的查詢詞 idf 佔比)。"""
+        scores = np.zeros(len(self.doc_len), dtype="float32")
+        matched = np.zeros(len(self.doc_len), dtype="float32")
+        terms = set(self.tokenize(query))
+        total_idf = 0.0
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                total_idf += self.max_idf
+                continue
+            idf = self.idf[term_id]
+            total_idf += idf
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype("float32")
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self.norm[docs])
+            matched[docs] += idf
+        coverage = matched / total_idf if total_idf else matched
+        return scores, coverage
+
+    def matched_terms(self, query, doc_id):
+        """查詢中有幾個不同的詞出現在該文件（posting list 依文件編號排序，用二分搜尋）。"""
+        count = 0
+        for term in set(self.tokenize(query)):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            docs = self.doc_ids[self.indptr[term_id]:self.indptr[term_id + 1]]
+            pos = np.searchsorted(docs, doc_id)
+            count += bool(pos < len(docs) and docs[pos] == doc_id)
+        return count
+
+    def search(self, query, k=5):
+        """回傳 [(文件編號, BM25 分數, 查詢詞覆蓋率), ...]，依分數由高到低。"""
+        scores, coverage = self.scores(query)
+        k = min(k, len(scores))
+        if not k:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i]), float(coverage[i])) for i in top if scores[i] > 0]
@@ -3,7 +3,12 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import sqlite3
 import io
+import json
 from datetime import datetime
+import feedback_queries as fq
+import feedback_rollup
+import feedback_export
+import os
 
 # --- 頁面設定 ---
 st.set_page_config(page_title="交通部 AI 後台系統", layout="wide")
@@ -29,16 +34,91 @@ button, .stButton>button {
 """
 st.markdown(custom_css, unsafe_allow_html=True)
 
-# --- 從 SQLite 載入資料 ---
-@st.cache_data
-def load_data():
+# --- 從 SQLite 查詢資料 ---
+# 篩選、統計與分頁都在 SQLite 執行；快取以 (資料筆數, 最大 id, 異動計數) 為版本，有新回饋或主題回填時自動失效
+PAGE_SIZES = [20, 50, 100, 200]
+EXPORT_MAX_MB = int(os.getenv("DASHBOARD_EXPORT_MAX_MB", "200"))  # 超過就不提供下載，請使用者縮小範圍
+EXPORT_TTL = int(os.getenv("DASHBOARD_EXPORT_TTL", "3600"))  # 匯出暫存檔保留秒數
+
+
+@st.cache_resource
+def prepare_db():
+    feedback_export.sweep_stale_exports(EXPORT_TTL)  # 伺服器啟動時清掉上次中斷留下的匯出暫存檔
+    conn = fq.connect()
+    try:
+        return fq.ensure_schema(conn)
+    finally:
+        conn.close()
+
+
+def current_version():
+    conn = fq.connect()
+    try:
+        return fq.data_version(conn)
+    finally:
+        conn.close()
+
+
+@st.cache_data(max_entries=8)
+def load_bounds(version):
+    conn = fq.connect()
+    try:
+        return fq.time_bounds(conn), fq.topics(conn)
+    finally:
+        conn.close()
+
+
+# 摘要報告讀彙總表（feedback_rollup.py）；先補齊水位線之後的新資料與待補主題的資料列，通常背景 worker 已經處理過
+# version 含 feedback 的 rev 計數（新增、回填主題、刪除都會遞增），主題回填後快取會跟著失效，不會停在舊的摘要
+@st.cache_data(max_entries=32)
+def load_summary(version, start_date, end_date):
+    conn = fq.connect()
+    try:
+        feedback_rollup.catch_up(conn)
+        summary = pd.DataFrame(
+            feedback_rollup.topic_summary(conn, start_date, end_date), columns=["topic", "total", "helpful"]
+        )
+        return summary, feedback_rollup.top_terms(conn, start_date, end_date)
+    finally:
+        conn.close()
+
+
+@st.cache_data(max_entries=32)
+def load_count(version, **filters):
+    conn = fq.connect()
+    try:
+        return fq.count_rows(conn, **filters)
+    finally:
+        conn.close()
+
+
+@st.cache_data(max_entries=64)
+def load_rows(version, limit=None, offset=0, columns=fq.COLUMNS, **filters):
+    conn = fq.connect()
+    try:
+        return fq.fetch_rows(conn, limit, offset, columns, **filters)
+    finally:
+        conn.close()
+
+# --- 從 metrics 表載入各階段延遲（由 app.py 定期寫入）---
+@st.cache_data(ttl=60)
+def load_latency():
     conn = sqlite3.connect("feedback.db")
-    df = pd.read_sql_query("SELECT * FROM feedback", conn)
-    conn.close()
-    return df
+    try:
+        latency = pd.read_sql_query(
+            "SELECT time, labels, count, p95 FROM metrics WHERE name = 'rag_stage_seconds' AND count > 0", conn
+        )
+    except pd.errors.DatabaseError:
+        latency = pd.DataFrame(columns=["time", "labels", "count", "p95"])  # app.py 尚未寫入過指標
+    finally:
+        conn.close()
+    latency["time"] = pd.to_datetime(latency["time"], errors="coerce")
+    latency["stage"] = latency["labels"].apply(lambda x: json.loads(x).get("stage", ""))
+    return latency
 
-df = load_data()
-df["time"] = pd.to_datetime(df["time"], errors="coerce")
+prepare_db()
+version = current_version()
+(min_date, max_date), all_topics = load_bounds(version)
 
 # --- 側邊選單 ---
 menu = st.sidebar.radio("導航選單", [
@@ -51,22 +131,23 @@ menu = st.sidebar.radio("導航選單", [
 # --- 摘要報告 ---
 if menu == "📊 摘要報告":
     st.title("📊 摘要報告")
-    start_date = st.date_input("起始日期", value=df["time"].min().date())
-    end_date = st.date_input("結束日期", value=df["time"].max().date())
+    start_date = st.date_input("起始日期", value=min_date)
+    end_date = st.date_input("結束日期", value=max_date)
 
-    mask = (df["time"].dt.date >= start_date) & (df["time"].dt.date <= end_date)
-    filtered = df[mask]
+    summary, keywords = load_summary(version, start_date, end_date)
+    counts = summary.set_index("topic")["total"]
+    total = int(counts.sum())
 
-    st.subheader(f"資料總筆數：{len(filtered)}")
+    st.subheader(f"資料總筆數：{total}")
 
-    topic_counts = filtered["topic"].replace({
+    topic_counts = counts.rename({
         "交通違規": "Violation",
         "大眾運輸": "Public Transport",
         "道路建設": "Infrastructure",
         "政策建議": "Policy Advice",
         "其他": "Other"
-    }).value_counts()
-    topic_percent = (topic_counts / len(filtered) * 100).round(1)
+    }).groupby(level=0).sum().sort_values(ascending=False)
+    topic_percent = (topic_counts / max(total, 1) * 100).round(1)
 
     fig, ax = plt.subplots(figsize=(5, 3.5))
     bars = ax.bar(topic_counts.index, topic_counts.values, color="#264e86")
@@ -82,58 +163,128 @@ if menu == "📊 摘要報告":
     matplotlib.rcParams['font.family'] = 'Arial'
     st.pyplot(fig)
 
+    st.subheader("各主題滿意度：")
+    satisfaction = summary.assign(滿意比例=(summary["helpful"] / summary["total"]).round(3))
+    st.dataframe(satisfaction.rename(columns={"topic": "主題", "total": "筆數", "helpful": "滿意筆數"}),
+                 hide_index=True)
+
+    st.subheader("回應延遲趨勢（p95，秒）：")
+    latency = load_latency()
+    latency = latency[(latency["time"].dt.date >= start_date) & (latency["time"].dt.date <= end_date)]
+    if latency.empty:
+        st.caption("此期間尚無延遲資料")
+    else:
+        trend = latency.pivot_table(index=latency["time"].dt.floor("h"), columns="stage", values="p95", aggfunc="max")
+        st.line_chart(trend)
+
     st.subheader("主題關鍵字統計：")
-    for topic in filtered["topic"].unique():
-        keywords = filtered[filtered["topic"] == topic]["question"].str.cat(sep=" ")
-        keyword_list = pd.Series(keywords.split()).value_counts().head(5).index.tolist()
+    for topic, keyword_list in keywords.items():
         st.markdown(f"**{topic}**：{', '.join(keyword_list)}")
 
 # --- 資料總覽 ---
 elif menu == "📁 資料總覽":
     st.title("📁 民意資料瀏覽")
     topic_labels = ["交通違規", "大眾運輸", "道路建設", "政策建議", "其他"]
-    tabs = st.tabs(topic_labels)
-
-    for i, tab in enumerate(tabs):
-        with tab:
-            topic_key = topic_labels[i]
-            st.subheader(topic_key)
-            topic_df = df[df["topic"] == topic_key]  # 精準比對
-            keyword = st.text_input("🔍 搜尋此分類內容", key=f"kw_{i}")
-            if keyword:
-                topic_df = topic_df[
-                    topic_df["question"].str.contains(keyword, case=False, na=False) |
-                    topic_df["answer"].str.contains(keyword, case=False, na=False)
-                ]
-            for _, row in topic_df.iterrows():
-                with st.container():
-                    st.markdown(f"**問題摘要：** {row['question'][:60]}...")
-                    st.markdown(f"📌 分類：{row['topic']} ｜ 🕒 時間：{row['time'].strftime('%Y/%m/%d %H:%M')}  ")
-                    if 'answer' in row and row['answer']:
-                        st.markdown(f"💬 回覆內容：{row['answer'][:100]}...")
-                    if 'helpful' in row:
-                        st.markdown(f"👍 滿意度：{'滿意' if row['helpful']=='是' else '不滿意'}")
-                    if 'report' in row and row['report']:
-                        st.markdown(f"📝 補充說明：{row['report']}")
-                    st.markdown("---")
+    # 用 radio 代替 st.tabs：st.tabs 每次重新執行都會把五個分頁全部畫出來，這裡只查詢並繪製目前選的分類
+    topic_key = st.radio("主題分類", topic_labels, horizontal=True, key="browse_topic")
+    st.subheader(topic_key)
+
+    col_kw, col_size, col_mode = st.columns([3, 1, 1])
+    keyword = col_kw.text_input("🔍 搜尋此分類內容", key=f"kw_{topic_key}")
+    page_size = col_size.selectbox("每頁筆數", PAGE_SIZES, index=1, key="page_size")
+    compact = col_mode.toggle("精簡表格", value=False, key="compact")
+    filters = dict(topics=[topic_key], keyword=keyword or None)  # 精準比對
+
+    # keyset 分頁：session_state 存每一頁開頭的游標（上一頁最後一筆的 id），條件改變時回到第一頁
+    state_key = (topic_key, keyword, page_size)
+    if st.session_state.get("browse_state") != state_key:
+        st.session_state.browse_state = state_key
+        st.session_state.cursors = [None]
+    cursors = st.session_state.cursors
+
+    total = load_count(version, **filters)
+    topic_df = load_rows(version, page_size, before_id=cursors[-1], **filters)
+    pages = max((total - 1) // page_size + 1, 1)
+    st.caption(f"第 {len(cursors)} / {pages} 頁，共 {total} 筆")
+
+    if compact:
+        table = topic_df[["time", "question", "answer", "helpful", "report"]].copy()
+        table["question"] = table["question"].str.slice(0, 60)
+        table["answer"] = table["answer"].str.slice(0, 100)
+        st.dataframe(table, use_container_width=True, hide_index=True)
+    else:
+        for _, row in topic_df.iterrows():
+            # 每筆合成一次 st.markdown，減少前端元件數量
+            lines = [
+                f"**問題摘要：** {row['question'][:60]}...",
+                f"📌 分類：{row['topic']} ｜ 🕒 時間：{row['time'].strftime('%Y/%m/%d %H:%M')}",
+            ]
+            if row['answer']:
+                lines.append(f"💬 回覆內容：{row['answer'][:100]}...")
+            lines.append(f"👍 滿意度：{'滿意' if row['helpful']=='是' else '不滿意'}")
+            if row['report']:
+                lines.append(f"📝 補充說明：{row['report']}")
+            st.markdown("  \n".join(lines) + "\n\n---")
+
+    col_prev, col_next = st.columns(2)
+    if col_prev.button("⬅️ 上一頁", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    if col_next.button("下一頁 ➡️", disabled=len(topic_df) < page_size):
+        cursors.append(int(topic_df["id"].iloc[-1]))
+        st.rerun()
 
 # --- 資料匯出 ---
 elif menu == "📤 資料匯出":
     st.title("📤 資料匯出工具")
-    category = st.multiselect("主題分類", options=df["topic"].unique(), default=list(df["topic"].unique()))
-    start_date = st.date_input("起始日期", value=df["time"].min().date(), key="export_start")
-    end_date = st.date_input("結束日期", value=df["time"].max().date(), key="export_end")
-    export_df = df[df["topic"].isin(category)]
-    export_df = export_df[(export_df["time"].dt.date >= start_date) & (export_df["time"].dt.date <= end_date)]
+    category = st.multiselect("主題分類", options=all_topics, default=all_topics)
+    start_date = st.date_input("起始日期", value=min_date, key="export_start")
+    end_date = st.date_input("結束日期", value=max_date, key="export_end")
+    fmt = st.selectbox("檔案格式", list(feedback_export.FORMATS))
+    filters = dict(topics=category, start_date=start_date, end_date=end_date)
+    st.caption(f"符合條件：{load_count(version, **filters)} 筆")
+
+    # 按下才產生：從 SQLite cursor 分批寫進暫存檔，下載時直接讀檔，不在 session 保留整份內容
+    # 條件或格式改變、下載完成時刪檔；沒下載就離開的 session 留下的檔案超過 EXPORT_TTL 秒後清掉
+    feedback_export.sweep_stale_exports(EXPORT_TTL)
+    export = st.session_state.get("export")
+    if export and (export["key"] != (fmt, str(filters), version) or not os.path.exists(export["path"])):
+        feedback_export.remove_export(export["path"])
+        export = st.session_state.export = None
+    if st.button("🛠️ 產生匯出檔"):
+        conn = fq.connect()
+        try:
+            with st.spinner("匯出中…"):
+                path = feedback_export.export_to_file(conn, fmt, **filters)
+        except ImportError as e:
+            st.error(str(e))
+        else:
+            size = os.path.getsize(path)
+            if size > EXPORT_MAX_MB * 1024 * 1024:
+                feedback_export.remove_export(path)
+                st.warning(f"匯出檔 {size / 1024 / 1024:.0f} MB 超過上限 {EXPORT_MAX_MB} MB，"
+                           "請縮小日期範圍或主題，或改用 NDJSON (gzip) / Parquet 格式")
+            else:
+                export = st.session_state.export = {"key": (fmt, str(filters), version), "path": path}
+        finally:
+            conn.close()
+    if export:
+        suffix, mime = feedback_export.FORMATS[fmt]
+
+        def finish_download(path=export["path"]):
+            feedback_export.remove_export(path)
+            st.session_state.export = None
 
-    st.download_button("⬇️ 匯出 CSV", export_df.to_csv(index=False).encode("utf-8-sig"), file_name="export.csv", mime="text/csv")
-    st.download_button("⬇️ 匯出 JSON", export_df.to_json(orient="records", force_ascii=False), file_name="export.json", mime="application/json")
+        with open(export["path"], "rb") as f:
+            st.download_button(f"⬇️ 下載 {fmt}（{os.path.getsize(export['path']) / 1024 / 1024:.1f} MB）", f,
+                               file_name=f"export{suffix}", mime=mime, on_click=finish_download)
 
 # --- 主題搜尋 ---
 elif menu == "🔍 主題搜尋":
     st.title("🔍 主題快速搜尋")
     search_kw = st.text_input("請輸入欲查詢的關鍵字")
     if search_kw:
-        result_df = df[df["question"].str.contains(search_kw, case=False, na=False)]
-        st.write(f"共找到 {len(result_df)} 筆資料：")
+        total = load_count(version, keyword=search_kw, fields=("question",))
+        result_df = load_rows(version, 1000, keyword=search_kw, fields=("question",))
+        st.write(f"共找到 {total} 筆資料{'（顯示最新 1000 筆）' if total > 1000 else ''}：")
         st.dataframe(result_df[["time", "topic", "question", "answer"]], use_container_width=True)
@@ -0,0 +1,100 @@
+# 向量嵌入後端：PyTorch 原版 bge-large-zh、較小的 bge-small-zh、ONNX Runtime int8 動態量化版 bge-large-zh
+# 以 EMBED_BACKEND 選擇；換後端後需重跑 main.py（向量快取與索引 sidecar 都記錄了 backend_id）
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+BACKENDS = {
+    "torch": "BAAI/bge-large-zh",
+    "small": "BAAI/bge-small-zh",
+    "onnx-int8": "BAAI/bge-large-zh",
+}
+ONNX_DIR = "onnx_bge_large_zh_int8"
+
+
+# 寫進快取與索引 sidecar 的識別字串，後端不同向量就不能混用
+def backend_id(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"不支援的嵌入後端：{backend}，可用：{', '.join(BACKENDS)}")
+    return BACKENDS[backend] if backend != "onnx-int8" else f"{BACKENDS[backend]}:onnx-int8"
+
+
+def current_backend():
+    return os.getenv("EMBED_BACKEND", "torch")
+
+
+class OnnxEncoder:
+    """以 ONNX Runtime 執行匯出的 bge 模型，介面與 SentenceTransformer.encode 相同（取 CLS 向量）。"""
+
+    def __init__(self, model_dir=ONNX_DIR, max_length=512):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        if not (model_dir / "model_int8.onnx").exists():
+            raise FileNotFoundError(f"找不到 {model_dir}/model_int8.onnx，請先執行 python embedding_backend.py 匯出")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            str(model_dir / "model_int8.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32, **kwargs):
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            tokens = self.tokenizer(
+                list(texts[start:start + batch_size]), padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np"
+            )
+            feeds = {k: v.astype("int64") for k, v in tokens.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            outputs.append(hidden[:, 0])
+        vectors = np.concatenate(outputs).astype("float32") if outputs else np.zeros((0, 0), "float32")
+        if normalize_embeddings and len(vectors):
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+def load_encoder(backend=None):
+    backend = backend or current_backend()
+    backend_id(backend)
+    if backend == "onnx-int8":
+        return OnnxEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(BACKENDS[backend])
+
+
+# 匯出 bge-large-zh 為 ONNX，再做 int8 動態量化（只需執行一次）
+def export_onnx_int8(model_name=BACKENDS["onnx-int8"], out_dir=ONNX_DIR):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    sample = tokenizer(["為這句話生成表示以用於檢索: 罰單怎麼繳"], return_tensors="pt")
+    names = list(sample.keys())
+    fp32_path = out_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), str(fp32_path),
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in names},
+                          "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=17
+        )
+    quantize_dynamic(str(fp32_path), str(out_dir / "model_int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(out_dir)
+    fp32_path.unlink()
+    print(f"已匯出 {out_dir}/model_int8.onnx")
+
+
+if __name__ == "__main__":
+    export_onnx_int8()
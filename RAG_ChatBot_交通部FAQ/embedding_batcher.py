@@ -0,0 +1,61 @@
+# 查詢向量微批次：多位使用者同時提問時，把短時間內的請求合併成一次 model.encode
+
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatchEncoder:
+    """收集最多 max_batch 筆或等待 max_wait_ms 毫秒後，一次呼叫 encode(texts)。
+
+    所有請求共用同一個模型與同一條背景執行緒，模型不會被多個執行緒同時呼叫。
+    """
+
+    def __init__(self, encode, max_batch=32, max_wait_ms=10):
+        self.encode = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self.queue.put((text, future))
+        return future
+
+    def encode_one(self, text):
+        return self.submit(text).result()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self.queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+            texts = [text for text, _ in batch]
+            try:
+                vectors = self.encode(texts)
+            except Exception as e:
+                logger.exception("批次嵌入 %d 筆失敗", len(batch))
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
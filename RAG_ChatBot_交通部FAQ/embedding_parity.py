@@ -0,0 +1,69 @@
+# 嵌入後端一致性檢查：比較候選後端與基準後端在 faq_data.csv 上的向量偏移與 top-1 檢索一致率
+# 用法：python embedding_parity.py --reference torch --candidate onnx-int8
+# 一致率低於 --min-agreement 或平均 cosine 低於 --min-cosine 時以非零狀態結束，可放進換後端前的檢查流程
+
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from embedding_backend import BACKENDS, load_encoder
+
+PREFIX = "為這句話生成表示以用於檢索: "
+
+
+def encode(encoder, texts, batch_size=32):
+    start = time.perf_counter()
+    vectors = np.asarray(encoder.encode([PREFIX + t for t in texts], normalize_embeddings=True,
+                                        batch_size=batch_size), dtype="float32")
+    return vectors, (time.perf_counter() - start) * 1000 / len(texts)
+
+
+def run_backend(backend, faq_texts, questions):
+    encoder = load_encoder(backend)
+    docs, doc_ms = encode(encoder, faq_texts)
+    queries, query_ms = encode(encoder, questions)
+    top1 = np.argmax(queries @ docs.T, axis=1)
+    return {"docs": docs, "queries": queries, "top1": top1, "doc_ms": doc_ms, "query_ms": query_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="嵌入後端一致性檢查")
+    parser.add_argument("--data", default="faq_data.csv")
+    parser.add_argument("--reference", choices=BACKENDS, default="torch")
+    parser.add_argument("--candidate", choices=BACKENDS, default="onnx-int8")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="top-1 一致率下限")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="同維度時，平均 cosine 下限")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data)
+    faq_texts = [f"Q: {row['問題']} A: {row['答覆']}" for _, row in df.iterrows()]
+    questions = df["問題"].astype(str).tolist()
+    truth = np.arange(len(df))
+
+    ref = run_backend(args.reference, faq_texts, questions)
+    cand = run_backend(args.candidate, faq_texts, questions)
+
+    agreement = float(np.mean(ref["top1"] == cand["top1"]))
+    print(f"資料筆數：{len(df)}")
+    print(f"{'後端':<12}{'文件 ms/筆':>12}{'查詢 ms/筆':>12}{'top-1 正確率':>14}")
+    for name, r in ((args.reference, ref), (args.candidate, cand)):
+        print(f"{name:<12}{r['doc_ms']:>12.1f}{r['query_ms']:>12.1f}{np.mean(r['top1'] == truth):>14.3f}")
+    print(f"top-1 一致率：{agreement:.3f}")
+
+    ok = agreement >= args.min_agreement
+    if ref["docs"].shape[1] == cand["docs"].shape[1]:
+        cosine = np.sum(ref["docs"] * cand["docs"], axis=1)
+        print(f"文件向量 cosine：平均 {cosine.mean():.4f}、最小 {cosine.min():.4f}、p5 {np.percentile(cosine, 5):.4f}")
+        ok = ok and cosine.mean() >= args.min_cosine
+    else:
+        print(f"向量維度不同（{ref['docs'].shape[1]} vs {cand['docs'].shape[1]}），只比較檢索一致率")
+
+    print("✅ 通過" if ok else "❌ 未通過：換用此後端前請先確認回答品質")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# 本機假 Groq 伺服器：提供 OpenAI 相容的 /openai/v1/chat/completions（含 SSE 串流），延遲可調
+# 用法：python fake_groq_server.py --port 8765 --first-token-delay 0.3 --token-delay 0.02
+# app.py 端設定 GROQ_BASE_URL=http://127.0.0.1:8765 即會改連到這裡（Groq SDK 會讀這個環境變數）
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_llm import FakeGroqClient
+
+
+def make_handler(first_token_delay, token_delay, chars_per_token=2):
+    replies = FakeGroqClient(chars_per_token=chars_per_token)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            text = replies.reply_for(body["messages"][-1]["content"])
+            tokens = [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+            tokens = tokens[:body.get("max_tokens", 512)]
+            base = {"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model", "fake")}
+            if body.get("stream"):
+                self._stream(base, tokens)
+            else:
+                time.sleep(first_token_delay + token_delay * len(tokens))
+                payload = dict(base, choices=[{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                }], usage={"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)})
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        def _stream(self, base, tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            time.sleep(first_token_delay)
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_delay)
+                chunk = dict(base, object="chat.completion.chunk",
+                             choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _write_chunk(self, text):
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+# 在背景執行緒啟動伺服器，回傳 server（server.server_address 可取得實際 port）
+def start_server(port=0, first_token_delay=0.3, token_delay=0.02):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(first_token_delay, token_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-groq", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本機假 Groq 伺服器")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.first_token_delay, args.token_delay))
+    print(f"假 Groq 伺服器已啟動：http://127.0.0.1:{args.port}")
+    server.serve_forever()
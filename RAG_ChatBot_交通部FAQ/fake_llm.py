@@ -0,0 +1,72 @@
+# 本機假 LLM：介面與 Groq client 的 chat.completions.create 相同，測試或壓測時不必呼叫真正的 API
+# 設定 LLM_BACKEND=fake 即可讓 app.py 改用這個 client
+
+import asyncio
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeGroqClient:
+    """模擬 Groq 回應：改寫題回傳原始回答、分類題回傳「其他」，串流時逐字吐出 token。
+
+    first_token_delay 為送出請求到第一個 token 的等待秒數，token_delay 為之後每個 token 的間隔。
+    """
+
+    def __init__(self, first_token_delay=0.3, token_delay=0.02, chars_per_token=2):
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.chars_per_token = chars_per_token
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model=None, messages=None, stream=False, max_tokens=512, **kwargs):
+        tokens = self._tokens(messages, max_tokens)
+        if stream:
+            return self._stream(tokens)
+        time.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        message = SimpleNamespace(content="".join(tokens))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _tokens(self, messages, max_tokens):
+        self.calls += 1
+        text = self.reply_for(messages[-1]["content"])
+        tokens = [text[i:i + self.chars_per_token] for i in range(0, len(text), self.chars_per_token)]
+        return tokens[:max_tokens]
+
+    def reply_for(self, prompt):
+        match = re.search(r"原始回答：(.*?)\n\n", prompt, re.S)
+        if match:
+            return f"您好，{match.group(1).strip()}"
+        if "請回覆對應主題" in prompt:
+            numbered = re.findall(r"^(\d+)\. ", prompt, re.M)
+            return "\n".join(f"{n}. 其他" for n in numbered) if numbered else "其他"
+        return "對不起，您問的問題我目前無法回答，詳情請洽交通部客服專線詢問：0800-231-161。"
+
+    def _stream(self, tokens):
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_delay)
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class AsyncFakeGroqClient(FakeGroqClient):
+    """AsyncGroq 版本：create 為 coroutine，串流時回傳 async iterator，等待不佔用執行緒。"""
+
+    async def create(self, model=None, messages=None, stream=False, max_tokens=512, **kwargs):
+        tokens = self._tokens(messages, max_tokens)
+        if stream:
+            return self._astream(tokens)
+        await asyncio.sleep(self.first_token_delay + self.token_delay * len(tokens))
+        message = SimpleNamespace(content="".join(tokens))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def _astream(self, tokens):
+        await asyncio.sleep(self.first_token_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
@@ -0,0 +1,117 @@
+# 回饋資料匯出：從 SQLite cursor 分批讀取，邊讀邊寫進暫存檔，不把整份資料組成一個字串
+# 暫存檔以 EXPORT_PREFIX 命名，寫入失敗時即刪除；下載或作廢後由呼叫端 remove_export，
+# session 結束或行程中斷留下的舊檔由 sweep_stale_exports 依存放時間清掉
+# 支援 CSV、JSON、gzip 壓縮的 NDJSON 與 Parquet（需安裝 pyarrow）
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+import time
+from contextlib import suppress
+from pathlib import Path
+
+import feedback_queries as fq
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_PREFIX = "feedback_export_"
+FIELDS = ["id", "time", "question", "answer", "helpful", "report", "topic"]
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "JSON": (".json", "application/json"),
+    "NDJSON (gzip)": (".ndjson.gz", "application/gzip"),
+    "Parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def iter_batches(conn, chunk_size=5000, **filters):
+    """依條件逐批取出 feedback 資料列（list of tuple），依 id 由舊到新。"""
+    where, params = fq.build_filter(fts=fq.has_fts(conn), **filters)
+    cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM feedback {where} ORDER BY id", params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+def _write_csv(batches, f):
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(FIELDS)
+    for rows in batches:
+        writer.writerows(rows)
+    text.flush()
+    text.detach()
+
+
+def _write_json(batches, f):
+    f.write(b"[")
+    first = True
+    for rows in batches:
+        for row in rows:
+            f.write((b"" if first else b",\n") + json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False).encode("utf-8"))
+            first = False
+    f.write(b"]")
+
+
+def _write_ndjson_gz(batches, f):
+    with gzip.GzipFile(fileobj=f, mode="wb") as gz:
+        for rows in batches:
+            gz.write("".join(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + "\n" for row in rows).encode("utf-8"))
+
+
+def _write_parquet(batches, f):
+    if pq is None:
+        raise ImportError("匯出 Parquet 需先安裝 pyarrow：pip install pyarrow")
+    schema = pa.schema([("id", pa.int64())] + [(name, pa.string()) for name in FIELDS[1:]])
+    with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+        for rows in batches:
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch([pa.array(c, type=t) for c, t in zip(columns, schema.types)],
+                                               schema=schema))
+
+
+WRITERS = {
+    "CSV": _write_csv,
+    "JSON": _write_json,
+    "NDJSON (gzip)": _write_ndjson_gz,
+    "Parquet": _write_parquet,
+}
+
+
+def export_to_file(conn, fmt, chunk_size=5000, **filters):
+    """把符合條件的資料寫進暫存檔並回傳路徑；呼叫端負責刪除。寫入失敗（例如缺 pyarrow）時不留下檔案。"""
+    suffix, _ = FORMATS[fmt]
+    with tempfile.NamedTemporaryFile(prefix=EXPORT_PREFIX, suffix=suffix, delete=False) as f:
+        try:
+            WRITERS[fmt](iter_batches(conn, chunk_size, **filters), f)
+        except BaseException:
+            f.close()
+            with suppress(FileNotFoundError):
+                os.remove(f.name)
+            raise
+        return f.name
+
+
+def remove_export(path):
+    with suppress(FileNotFoundError):
+        os.remove(path)
+
+
+# 刪除超過 max_age 秒的匯出暫存檔（session 結束沒下載或行程中斷時留下的）
+def sweep_stale_exports(max_age=3600):
+    removed = 0
+    for path in Path(tempfile.gettempdir()).glob(f"{EXPORT_PREFIX}*"):
+        with suppress(FileNotFoundError):
+            if time.time() - path.stat().st_mtime > max_age:
+                path.unlink()
+                removed += 1
+    return removed
@@ -0,0 +1,133 @@
+# dashboard.py 用的 feedback 查詢：日期篩選、分頁與關鍵字搜尋都交給 SQLite（主題統計見 feedback_rollup.py），只把需要的列讀進 pandas
+# 關鍵字搜尋用 FTS5（trigram 斷詞，中文不需另外斷詞）；SQLite 不支援或關鍵字少於 3 字時改用 LIKE
+
+import datetime
+import sqlite3
+
+import pandas as pd
+
+DB_PATH = "feedback.db"
+COLUMNS = "id, time, question, answer, helpful, report, topic"
+
+
+def connect(db_path=DB_PATH):
+    return sqlite3.connect(db_path, timeout=30)
+
+
+def ensure_schema(conn):
+    """建立查詢用的索引與 FTS5 表（可重複呼叫）；回傳是否可用 FTS5。"""
+    with conn:
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_time ON feedback (time)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_topic_time ON feedback (topic, time)")
+        # 異動計數：feedback 任何新增、修改（例如背景 worker 回填主題）或刪除都加一，供快取判斷是否失效
+        conn.execute("CREATE TABLE IF NOT EXISTS feedback_rev (rev INTEGER NOT NULL)")
+        conn.execute("INSERT INTO feedback_rev (rev) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM feedback_rev)")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(f"""CREATE TRIGGER IF NOT EXISTS feedback_rev_{event.lower()} AFTER {event} ON feedback BEGIN
+                UPDATE feedback_rev SET rev = rev + 1;
+            END""")
+    try:
+        with conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'"
+            ).fetchone()
+            if exists:
+                return True
+            conn.execute("""CREATE VIRTUAL TABLE feedback_fts USING fts5(
+                question, answer, content='feedback', content_rowid='id', tokenize='trigram'
+            )""")
+            # 觸發器讓 app.py 新增／回填主題時同步更新全文索引
+            conn.execute("""CREATE TRIGGER feedback_fts_ai AFTER INSERT ON feedback BEGIN
+                INSERT INTO feedback_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END""")
+            conn.execute("""CREATE TRIGGER feedback_fts_ad AFTER DELETE ON feedback BEGIN
+                INSERT INTO feedback_fts (feedback_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+            END""")
+            conn.execute("""CREATE TRIGGER feedback_fts_au AFTER UPDATE OF question, answer ON feedback BEGIN
+                INSERT INTO feedback_fts (feedback_fts, rowid, question, answer)
+                VALUES ('delete', old.id, old.question, old.answer);
+                INSERT INTO feedback_fts (rowid, question, answer) VALUES (new.id, new.question, new.answer);
+            END""")
+            conn.execute("INSERT INTO feedback_fts (feedback_fts) VALUES ('rebuild')")
+        return True
+    except sqlite3.OperationalError:
+        return False  # 編譯時未含 FTS5 或 trigram 斷詞
+
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'feedback_fts'").fetchone() is not None
+
+
+# 快取失效用的版本號：feedback 有新增、修改或刪除時就會改變（異動計數由 ensure_schema 建立的觸發器維護）
+def data_version(conn):
+    count, max_id = conn.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM feedback").fetchone()
+    try:
+        rev = conn.execute("SELECT rev FROM feedback_rev").fetchone()[0]
+    except sqlite3.OperationalError:
+        rev = 0  # 尚未執行 ensure_schema 的舊資料庫
+    return count, max_id, rev
+
+
+def time_bounds(conn):
+    """回傳 (最早日期, 最晚日期)；沒有資料時皆為今天。"""
+    low, high = conn.execute("SELECT MIN(time), MAX(time) FROM feedback").fetchone()
+    today = datetime.date.today()
+    return (
+        datetime.datetime.fromisoformat(low).date() if low else today,
+        datetime.datetime.fromisoformat(high).date() if high else today,
+    )
+
+
+def topics(conn):
+    return [row[0] for row in conn.execute("SELECT DISTINCT topic FROM feedback WHERE topic IS NOT NULL ORDER BY topic")]
+
+
+# 組出 WHERE 子句：time 存的是 ISO 字串，日期區間轉成 [起始日, 結束日隔天) 的字串比較，可以用到索引
+# before_id 為 keyset 分頁的游標：只取 id 小於它的資料列，翻到多深都只掃一頁的量
+def build_filter(start_date=None, end_date=None, topics=None, keyword=None, fields=("question", "answer"),
+                 before_id=None, fts=False):
+    clauses, params = [], []
+    if before_id is not None:
+        clauses.append("id < ?")
+        params.append(before_id)
+    if start_date:
+        clauses.append("time >= ?")
+        params.append(start_date.isoformat())
+    if end_date:
+        clauses.append("time < ?")
+        params.append((end_date + datetime.timedelta(days=1)).isoformat())
+    if topics is not None:
+        topics = list(topics)
+        if not topics:
+            clauses.append("0")
+        else:
+            clauses.append(f"topic IN ({', '.join('?' * len(topics))})")
+            params.extend(topics)
+    if keyword:
+        if fts and len(keyword) >= 3:
+            clauses.append("id IN (SELECT rowid FROM feedback_fts WHERE feedback_fts MATCH ?)")
+            params.append("{" + " ".join(fields) + '} : "' + keyword.replace('"', '""') + '"')
+        else:
+            clauses.append("(" + " OR ".join(f"{field} LIKE ? ESCAPE '\\'" for field in fields) + ")")
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            params.extend([pattern] * len(fields))
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def count_rows(conn, **filters):
+    where, params = build_filter(fts=has_fts(conn), **filters)
+    return conn.execute(f"SELECT COUNT(*) FROM feedback {where}", params).fetchone()[0]
+
+
+def fetch_rows(conn, limit=None, offset=0, columns=COLUMNS, **filters):
+    """依條件取出資料列（由新到舊），limit 為 None 時取全部。"""
+    where, params = build_filter(fts=has_fts(conn), **filters)
+    sql = f"SELECT {columns} FROM feedback {where} ORDER BY id DESC"
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset]
+    df = pd.read_sql_query(sql, conn, params=params)
+    if "time" in df:
+        df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    return df
@@ -0,0 +1,202 @@
+# 摘要報告用的彙總表：每日 × 主題的筆數、滿意筆數與問題詞頻，以 feedback.id 水位線增量更新
+# 還沒有主題（分類失敗或尚未回填）的資料列記在 rollup_pending，有主題後再計入，不會擋住後面的資料
+# 任何日期區間只要加總幾百列彙總資料，不必重掃 feedback 表
+# 用法：python feedback_rollup.py（補齊增量）／python feedback_rollup.py --rebuild（全部重算）
+
+import argparse
+import re
+import sqlite3
+import unicodedata
+
+try:
+    import jieba
+except ImportError:
+    jieba = None
+
+# 問句常見的套語，不列入關鍵字
+STOPWORDS = {
+    "請問", "如果", "我想", "想要", "怎麼", "怎麼辦", "什麼", "為什麼", "的話", "可以", "是否", "有沒有", "一下",
+    "要怎麼", "如何", "哪裡", "需要", "我們", "你們", "這個", "那個", "還是", "因為", "所以", "就是", "目前",
+    "問題", "謝謝", "請問一下", "有什麼", "辦法",
+}
+# 沒有 jieba 時的關鍵字詞典：交通業務常見用語，以最長匹配從問題中找出（字元 bigram 會切出「通部」「向交」這類片段）
+DOMAIN_TERMS = {
+    "交通部", "公路局", "監理站", "監理所", "高鐵", "臺鐵", "台鐵", "捷運", "公車", "客運", "計程車", "機車", "汽車",
+    "自行車", "腳踏車", "電動車", "電動機車", "駕照", "駕駛執照", "行照", "牌照", "車牌", "罰單", "罰鍰", "違規",
+    "違停", "超速", "酒駕", "闖紅燈", "測速", "照相", "停車", "停車場", "停車位", "停車費", "紅線", "黃線", "路口",
+    "號誌", "紅綠燈", "標線", "標誌", "道路", "公路", "國道", "高速公路", "快速道路", "省道", "橋梁", "隧道", "施工",
+    "路燈", "人行道", "斑馬線", "行人", "車禍", "事故", "保險", "強制險", "燃料費", "牌照稅", "驗車", "檢驗", "考照",
+    "路考", "筆試", "票價", "車票", "訂票", "退票", "月票", "悠遊卡", "誤點", "班次", "路線", "站牌", "月台", "無障礙",
+    "機場", "航空", "港口", "郵局", "郵件", "觀光", "氣象", "陳情", "檢舉", "申訴", "補助", "政策", "建議", "法規",
+    "條例", "處罰", "申請", "繳費", "退費", "行動通訊", "訊號", "通行費", "塞車", "壅塞", "噪音", "安全帽", "身障",
+}
+MAX_TERM_LEN = max(map(len, DOMAIN_TERMS))
+ASCII_TERM = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+
+
+def dictionary_tokenize(text):
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    tokens = ASCII_TERM.findall(text)
+    i = 0
+    while i < len(text):
+        for size in range(min(MAX_TERM_LEN, len(text) - i), 1, -1):
+            if text[i:i + size] in DOMAIN_TERMS:
+                tokens.append(text[i:i + size])
+                i += size
+                break
+        else:
+            i += 1
+    return tokens
+
+
+# 中文斷詞：有安裝 jieba 就用 jieba，否則只取 DOMAIN_TERMS 詞典裡的詞（與英數字詞）
+def tokenize(text):
+    if not text:
+        return []
+    if jieba is not None:
+        tokens = [t.strip().lower() for t in jieba.cut(text)]
+        tokens = [t for t in tokens if len(t) >= 2 and not t.isspace()]
+    else:
+        tokens = [t for t in dictionary_tokenize(text) if len(t) >= 2]
+    return [t for t in tokens if t not in STOPWORDS and not t.isdigit()]
+
+
+def init_rollup_tables(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS rollup_daily (
+        day TEXT,
+        topic TEXT,
+        total INTEGER,
+        helpful INTEGER,
+        PRIMARY KEY (day, topic)
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS rollup_terms (
+        day TEXT,
+        topic TEXT,
+        term TEXT,
+        count INTEGER,
+        PRIMARY KEY (day, topic, term)
+    )""")
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_state (name TEXT PRIMARY KEY, value INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS rollup_pending (id INTEGER PRIMARY KEY)")
+
+
+# 把已分類的資料列加進每日與詞頻彙總
+def _add_rows(conn, rows):
+    daily, terms = {}, {}
+    for _, time, question, helpful, topic in rows:
+        day = (time or "")[:10]
+        total, satisfied = daily.get((day, topic), (0, 0))
+        daily[(day, topic)] = (total + 1, satisfied + (helpful == "是"))
+        for term in set(tokenize(question)):
+            terms[(day, topic, term)] = terms.get((day, topic, term), 0) + 1
+    conn.executemany("""
+        INSERT INTO rollup_daily (day, topic, total, helpful) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, topic) DO UPDATE SET total = total + excluded.total, helpful = helpful + excluded.helpful
+    """, [(day, topic, total, satisfied) for (day, topic), (total, satisfied) in daily.items()])
+    conn.executemany("""
+        INSERT INTO rollup_terms (day, topic, term, count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, topic, term) DO UPDATE SET count = count + excluded.count
+    """, [(day, topic, term, count) for (day, topic, term), count in terms.items()])
+
+
+def catch_up(conn, batch_size=5000):
+    """把水位線之後的 feedback 與之前待補的資料列併進彙總表，回傳計入筆數。
+
+    水位線一律前進；還沒有主題的資料列記進 rollup_pending，等背景 worker 回填主題後下次再計入，
+    所以一筆分類失敗不會擋住後面的資料，且每筆回饋只會以最終主題計入一次。
+    """
+    init_rollup_tables(conn)
+    processed = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")  # 背景 worker 與 dashboard 可能同時呼叫，避免重複計入
+        try:
+            row = conn.execute("SELECT value FROM rollup_state WHERE name = 'feedback_id'").fetchone()
+            watermark = row[0] if row else 0
+            rows = conn.execute(
+                "SELECT id, time, question, helpful, topic FROM feedback WHERE id > ? ORDER BY id LIMIT ?",
+                (watermark, batch_size)
+            ).fetchall()
+            ready = [row for row in rows if row[4]]
+            conn.executemany("INSERT OR IGNORE INTO rollup_pending (id) VALUES (?)", [(row[0],) for row in rows if not row[4]])
+            _add_rows(conn, ready)
+            if rows:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_state (name, value) VALUES ('feedback_id', ?)", (rows[-1][0],)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        processed += len(ready)
+        if len(rows) < batch_size:
+            break
+    return processed + _catch_up_pending(conn)
+
+
+# 之前沒有主題的資料列：已回填主題的計入並移出待補清單，已刪除的直接移出
+def _catch_up_pending(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("""
+            SELECT f.id, f.time, f.question, f.helpful, f.topic FROM rollup_pending p JOIN feedback f ON f.id = p.id
+            WHERE f.topic IS NOT NULL AND f.topic != ''
+        """).fetchall()
+        _add_rows(conn, rows)
+        conn.executemany("DELETE FROM rollup_pending WHERE id = ?", [(row[0],) for row in rows])
+        conn.execute("DELETE FROM rollup_pending WHERE id NOT IN (SELECT id FROM feedback)")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return len(rows)
+
+
+def rebuild(conn):
+    init_rollup_tables(conn)
+    with conn:
+        conn.execute("DELETE FROM rollup_daily")
+        conn.execute("DELETE FROM rollup_terms")
+        conn.execute("DELETE FROM rollup_state")
+        conn.execute("DELETE FROM rollup_pending")
+    return catch_up(conn)
+
+
+def _day_range(start_date, end_date):
+    return start_date.isoformat(), end_date.isoformat()
+
+
+def topic_summary(conn, start_date, end_date):
+    """回傳 [(主題, 筆數, 滿意筆數), ...]，依筆數由多到少。"""
+    init_rollup_tables(conn)
+    return conn.execute("""
+        SELECT topic, SUM(total), SUM(helpful) FROM rollup_daily
+        WHERE day BETWEEN ? AND ? GROUP BY topic ORDER BY SUM(total) DESC
+    """, _day_range(start_date, end_date)).fetchall()
+
+
+def top_terms(conn, start_date, end_date, k=5):
+    """回傳 {主題: [前 k 個關鍵字]}，以提到該詞的問題數排序。"""
+    init_rollup_tables(conn)
+    rows = conn.execute("""
+        SELECT topic, term, SUM(count) AS n FROM rollup_terms
+        WHERE day BETWEEN ? AND ? GROUP BY topic, term ORDER BY topic, n DESC
+    """, _day_range(start_date, end_date)).fetchall()
+    result = {}
+    for topic, term, _ in rows:
+        terms = result.setdefault(topic, [])
+        if len(terms) < k:
+            terms.append(term)
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="更新摘要報告彙總表")
+    parser.add_argument("--db", default="feedback.db")
+    parser.add_argument("--rebuild", action="store_true", help="清空後從頭重算（例如手動改過主題後）")
+    args = parser.parse_args()
+    conn = sqlite3.connect(args.db, timeout=30, isolation_level=None)
+    try:
+        count = rebuild(conn) if args.rebuild else catch_up(conn)
+    finally:
+        conn.close()
+    print(f"已彙總 {count} 筆回饋")
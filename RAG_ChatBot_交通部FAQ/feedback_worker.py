@@ -0,0 +1,184 @@
+# 回饋處理：record_feedback 當下就把原始回饋寫進 SQLite，背景執行緒再批次分類主題並寫入 TXT / CSV
+
+import csv
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from feedback_rollup import catch_up
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CSV_HEADER = ["時間", "問題", "回答", "滿意與否", "錯誤補充", "主題分類"]
+EVENT_FIELDS = ["time", "question", "answer", "helpful", "report"]
+
+
+def connect(db_path, check_same_thread=True):
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")  # 寫入時不擋住 dashboard 的讀取
+    return conn
+
+
+class FeedbackPipeline:
+    """批次處理回饋事件。
+
+    submit() 在呼叫端同步把事件寫進 feedback 表（topic 先留空），佇列裡只放資料列 id，
+    背景執行緒再呼叫 classify_batch(questions) 一次分類整批問題並回填 topic。行程若在分類前中斷，
+    回饋本身已在資料庫裡，下次啟動時 backfill() 會補分類 topic 為空的資料列。
+    分類完成後把新資料併進摘要報告的彙總表；TXT / CSV 紀錄在資料列分類成功時寫入（含 backfill 補分類的），
+    每筆只寫一次。
+    """
+
+    def __init__(self, db_path, classify_batch, txt_path="feedback_log.txt", csv_path="feedback_log.csv",
+                 batch_size=20, max_wait=1.0):
+        self.db_path = db_path
+        self.classify_batch = classify_batch
+        self.txt_path = txt_path
+        self.csv_path = Path(csv_path)
+        self.batch_size = batch_size
+        self.max_wait = max_wait  # 一批從收到第一筆起最多等幾秒湊滿 batch_size
+        self.queue = queue.Queue()
+        self.insert_conn = None  # submit() 共用的連線，第一次寫入時建立
+        self.insert_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="feedback-worker", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def submit(self, event):
+        self.queue.put((self.insert(event), event))
+
+    # 寫進 feedback 表並回傳資料列 id；各請求執行緒共用一條連線，單筆小 transaction，WAL 模式下不會擋住 dashboard
+    def insert(self, event):
+        registry.inc("rag_feedback_events_total")
+        with self.insert_lock:
+            if self.insert_conn is None:
+                self.insert_conn = connect(self.db_path, check_same_thread=False)
+            with registry.timer("db_insert"), self.insert_conn:
+                return self.insert_conn.execute("""
+                    INSERT INTO feedback (time, question, answer, helpful, report, topic)
+                    VALUES (?, ?, ?, ?, ?, NULL)
+                """, [event[field] for field in EVENT_FIELDS]).lastrowid
+
+    def close(self):
+        with self.insert_lock:
+            if self.insert_conn is not None:
+                self.insert_conn.close()
+                self.insert_conn = None
+
+    # 等佇列內的事件都處理完（程式結束前呼叫）
+    def flush(self):
+        self.queue.join()
+
+    def backfill(self):
+        conn = connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT id, {', '.join(EVENT_FIELDS)} FROM feedback WHERE topic IS NULL OR topic = '' ORDER BY id"
+            ).fetchall()
+            for start in range(0, len(rows), self.batch_size):
+                self._classify_rows(conn, [(row[0], dict(zip(EVENT_FIELDS, row[1:])))
+                                           for row in rows[start:start + self.batch_size]])
+            self._rollup(conn)
+        finally:
+            conn.close()
+        if rows:
+            logger.info("已補分類 %d 筆未分類的回饋", len(rows))
+
+    def _run(self):
+        try:
+            self.backfill()
+        except Exception:
+            logger.exception("補分類回饋失敗")
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                pass
+            try:
+                self._process(batch)
+            except Exception:
+                logger.exception("分類 %d 筆回饋失敗，待下次啟動補分類", len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    # batch 為 submit() 放進佇列的 (資料列 id, 事件)
+    def _process(self, batch):
+        conn = connect(self.db_path)
+        try:
+            # 啟動時的 backfill() 可能已經分類過佇列裡的資料列
+            placeholders = ",".join("?" * len(batch))
+            pending = {row_id for row_id, in conn.execute(
+                f"SELECT id FROM feedback WHERE id IN ({placeholders}) AND (topic IS NULL OR topic = '')",
+                [row_id for row_id, _ in batch]
+            )}
+            batch = [(row_id, e) for row_id, e in batch if row_id in pending]
+            if not batch:
+                return
+            self._classify_rows(conn, batch)
+            self._rollup(conn)
+        finally:
+            conn.close()
+
+    # 分類一批 (資料列 id, 事件)、回填 topic，分類成功的才寫進 TXT / CSV（失敗的等 backfill 補分類時再寫）
+    def _classify_rows(self, conn, batch):
+        topics = self._classify([e["question"] for _, e in batch])
+        with registry.timer("db_update"):
+            self._update_topics(conn, [row_id for row_id, _ in batch], topics)
+        classified = [(e, topic) for (_, e), topic in zip(batch, topics) if topic]
+        if classified:
+            self._append_logs([e for e, _ in classified], [topic for _, topic in classified])
+
+    def _classify(self, questions):
+        try:
+            return self.classify_batch(questions)
+        except Exception:
+            logger.exception("主題分類失敗，保留未分類，待下次啟動補分類")
+            return [None] * len(questions)
+
+    def _rollup(self, conn):
+        try:
+            with registry.timer("rollup"):
+                catch_up(conn)
+        except Exception:
+            logger.exception("更新彙總表失敗，下次處理時會從水位線接著補")
+
+    def _update_topics(self, conn, ids, topics):
+        with conn:
+            conn.executemany(
+                "UPDATE feedback SET topic = ? WHERE id = ?",
+                [(topic, row_id) for row_id, topic in zip(ids, topics) if topic]
+            )
+
+    def _append_logs(self, batch, topics):
+        # 寫入 TXT（可選）
+        with open(self.txt_path, "a", encoding="utf-8") as f:
+            for e in batch:
+                f.write(
+                    f"[{e['time']}]\n"
+                    f"Q: {e['question']}\n"
+                    f"A: {e['answer']}\n"
+                    f"👍Helpful: {e['helpful']}\n"
+                    f"🐞Report: {e['report']}\n\n"
+                )
+
+        # 寫入 CSV
+        file_exists = self.csv_path.exists()
+        with open(self.csv_path, mode="a", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            if not file_exists:
+                writer.writerow(CSV_HEADER)
+            for e, topic in zip(batch, topics):
+                writer.writerow([e["time"], e["question"], e["answer"], e["helpful"], e["report"], topic or ""])
@@ -0,0 +1,95 @@
+# 各種索引類型對 Flat 基準的 recall 與查詢延遲報告
+# 用法：python index_benchmark.py                 （使用 main.py 產生的 faq_embed_cache.npz）
+#       python index_benchmark.py --synthetic 200000 （隨機向量，模擬完整知識庫規模）
+
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+import index_factory
+
+
+def load_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype("float32")
+    else:
+        vectors = np.load(args.cache)["vectors"].astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+# 查詢向量：從資料中抽樣再加雜訊，模擬「相近但不完全相同」的問題
+def make_queries(vectors, n, noise, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), min(n, len(vectors)), replace=False)]
+    queries = picks + noise * rng.standard_normal(picks.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return queries
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    _, I = index.search(queries, k)
+    return I, (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="索引 recall / 延遲報告")
+    parser.add_argument("--cache", default="faq_embed_cache.npz")
+    parser.add_argument("--synthetic", type=int, default=0, help="改用 N 筆隨機向量")
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--json", help="另存結果為 JSON")
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    queries = make_queries(vectors, args.queries, args.noise)
+    ids = np.arange(len(vectors))
+    k = min(args.k, len(vectors))
+
+    baseline, _ = index_factory.build_index("flat", vectors, ids)
+    truth, flat_ms = timed_search(baseline, queries, k)
+    results = [{"type": "flat", "params": {}, "search": {}, "recall": 1.0, "ms_per_query": flat_ms, "build_s": 0.0}]
+
+    sweeps = {
+        "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+        "hnsw": [{"ef_search": e} for e in (16, 32, 64, 128)],
+    }
+    for kind, settings in sweeps.items():
+        start = time.perf_counter()
+        index, params = index_factory.build_index(kind, vectors, ids)
+        build_s = time.perf_counter() - start
+        for setting in settings:
+            index_factory.set_search_params(index, **setting)
+            found, ms = timed_search(index, queries, k)
+            results.append({
+                "type": kind, "params": params, "search": setting,
+                "recall": recall_at_k(found, truth), "ms_per_query": ms, "build_s": build_s,
+            })
+
+    print(f"資料 {len(vectors)} 筆、維度 {vectors.shape[1]}、查詢 {len(queries)} 筆、recall@{k}")
+    print(f"{'類型':<10}{'查詢參數':<18}{'recall':>8}{'ms/查詢':>10}{'加速':>8}{'建置秒數':>10}")
+    for r in results:
+        setting = ",".join(f"{key}={value}" for key, value in r["search"].items()) or "-"
+        speedup = flat_ms / r["ms_per_query"] if r["ms_per_query"] else float("inf")
+        print(f"{r['type']:<10}{setting:<18}{r['recall']:>8.3f}{r['ms_per_query']:>10.3f}{speedup:>8.1f}{r['build_s']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
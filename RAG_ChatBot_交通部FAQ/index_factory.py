@@ -0,0 +1,98 @@
+# FAISS 索引工廠：Flat / IVF-Flat / HNSW / IVF-PQ，建立時把類型與參數寫進旁邊的 .meta.json
+
+import json
+import math
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+def meta_path(index_path):
+    return Path(f"{index_path}.meta.json")
+
+
+# 依資料量給預設參數：nlist 約為 4√n，IVF-PQ 的 nbits 會依訓練資料量下修
+def default_params(kind, n, dim):
+    nlist = max(1, min(int(4 * math.sqrt(max(n, 1))), max(n // 39, 1)))
+    if kind == "ivf_flat":
+        return {"nlist": nlist}
+    if kind == "hnsw":
+        return {"M": 32, "efConstruction": 200}
+    if kind == "ivf_pq":
+        m = next(m for m in (64, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+        nbits = max(4, min(8, int(math.log2(max(n // 39, 16)))))
+        return {"nlist": nlist, "m": m, "nbits": nbits}
+    return {}
+
+
+# 建立支援 add_with_ids 的空索引，ID 即 faq_data.csv 的列號
+def create_index(kind, dim, params):
+    if kind == "flat":
+        return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+    if kind == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, params["nlist"], faiss.METRIC_L2)
+    if kind == "hnsw":
+        hnsw = faiss.IndexHNSWFlat(dim, params["M"])
+        hnsw.hnsw.efConstruction = params["efConstruction"]
+        return faiss.IndexIDMap2(hnsw)
+    if kind == "ivf_pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, params["nlist"], params["m"], params["nbits"])
+    raise ValueError(f"不支援的索引類型：{kind}，可用：{', '.join(INDEX_TYPES)}")
+
+
+# HNSW 不支援刪除向量，資料有刪改時只能整個重建
+def supports_remove(kind):
+    return kind != "hnsw"
+
+
+# IVF 類索引需要先用抽樣資料訓練分群中心
+def train_index(index, vectors, sample_size=50000, seed=0):
+    if index.is_trained:
+        return
+    if len(vectors) > sample_size:
+        rng = np.random.default_rng(seed)
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+
+def build_index(kind, vectors, ids, params=None, train_sample=50000):
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    params = params or default_params(kind, len(vectors), vectors.shape[1])
+    index = create_index(kind, vectors.shape[1], params)
+    train_index(index, vectors, train_sample)
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+    return index, params
+
+
+def save_index(index, index_path, meta):
+    faiss.write_index(index, str(index_path))
+    meta = dict(meta, ntotal=int(index.ntotal))
+    meta_path(index_path).write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def load_meta(index_path):
+    path = meta_path(index_path)
+    if not path.exists():
+        return {"type": "flat", "params": {}}  # 沒有 sidecar 的舊版索引視為 Flat
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+# 查詢時可調的參數：IVF 的 nprobe、HNSW 的 efSearch
+def set_search_params(index, nprobe=None, ef_search=None):
+    inner = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass
+    if ef_search is not None and isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+
+
+def load_index(index_path, nprobe=None, ef_search=None, io_flags=0):
+    index = faiss.read_index(str(index_path), io_flags)
+    set_search_params(index, nprobe, ef_search)
+    return index, load_meta(index_path)
@@ -0,0 +1,81 @@
+# 併發壓測：模擬 1 / 8 / 32 位使用者同時提問，LLM 使用本機假 LLM（LLM_BACKEND=fake）
+# 用法：python load_test.py --users 1 8 32 --questions 20
+# 關閉答案與向量快取，量到的是每題都要嵌入 + 檢索 + LLM 的吞吐量
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+os.environ.setdefault("ANSWER_CACHE_MODE", "off")
+os.environ.setdefault("QUERY_CACHE_SIZE", "0")
+os.environ.setdefault("QUERY_CACHE_DB", "")
+os.environ.setdefault("MODEL_WARMUP", "eager")
+
+import app  # noqa: E402  環境變數需在匯入前設定
+
+
+async def ask(question):
+    start = time.perf_counter()
+    first_token = None
+    async for _, _, partial, _ in app.answer_question(question, []):
+        if partial and first_token is None:
+            first_token = time.perf_counter() - start
+    return time.perf_counter() - start, first_token or 0.0
+
+
+async def user(questions, latencies, first_tokens):
+    for question in questions:
+        latency, ttft = await ask(question)
+        latencies.append(latency)
+        first_tokens.append(ttft)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def run(users, per_user, corpus):
+    rng = random.Random(users)
+    latencies, first_tokens = [], []
+    batches_before = app.embed_batcher.stats()
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        user([rng.choice(corpus) + f" {i}-{j}" for j in range(per_user)], latencies, first_tokens)
+        for i in range(users)
+    ])
+    elapsed = time.perf_counter() - start
+    batches_after = app.embed_batcher.stats()
+    batches = batches_after["batches"] - batches_before["batches"]
+    items = batches_after["items"] - batches_before["items"]
+    return {
+        "users": users,
+        "questions": len(latencies),
+        "throughput_qps": len(latencies) / elapsed,
+        "p50_s": statistics.median(latencies),
+        "p95_s": percentile(latencies, 95),
+        "ttft_p50_s": statistics.median(first_tokens),
+        "avg_embed_batch": items / batches if batches else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="併發使用者壓測")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--questions", type=int, default=20, help="每位使用者的提問數")
+    args = parser.parse_args()
+
+    corpus = [app.faq_store.get(i, "問題") for i in range(len(app.faq_store))]
+    print(f"{'使用者':>6}{'題數':>6}{'吞吐量 q/s':>12}{'p50 秒':>9}{'p95 秒':>9}{'首字 p50':>10}{'平均批次':>10}")
+    for users in args.users:
+        r = await run(users, args.questions, corpus)
+        print(f"{r['users']:>6}{r['questions']:>6}{r['throughput_qps']:>12.2f}{r['p50_s']:>9.2f}"
+              f"{r['p95_s']:>9.2f}{r['ttft_p50_s']:>10.2f}{r['avg_embed_batch']:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,40 +5,175 @@ import pandas as pd
 import numpy as np
 import faiss
 import pickle
-from sentence_transformers import SentenceTransformer
+import hashlib
+import os
+import argparse
+from pathlib import Path
+import index_factory
+from embedding_backend import backend_id, current_backend, load_encoder
+from answer_store import write_store
+from bm25_index import BM25Index
 
-# 讀取資料
-df = pd.read_csv("/Users/hsuhuiyu/Documents/碩一下/資訊系統專案管理/data_finalproject/交通部常見問答集_清理版.csv")
+SOURCE_CSV = "/Users/hsuhuiyu/Documents/碩一下/資訊系統專案管理/data_finalproject/交通部常見問答集_清理版.csv"
+EMBED_BACKEND = current_backend()  # torch / small / onnx-int8，見 embedding_backend.py
+MODEL_NAME = backend_id(EMBED_BACKEND)
+INDEX_PATH = "faq.index"
+TEXTS_PATH = "faq_texts.pkl"
+DATA_PATH = "faq_data.csv"
+STORE_DIR = "faq_store"  # app.py 依列號以 mmap 讀取的問題／答覆欄位
+BM25_PATH = "faq_bm25.npz"  # 與 FAISS 融合的 BM25 倒排索引
+EMBED_CACHE_PATH = "faq_embed_cache.npz"  # 以文字 hash 為 key 的向量快取，跨次執行保留
+EMBED_BATCH_SIZE = 32
 
-# 載入模型
-model = SentenceTransformer('BAAI/bge-large-zh')
+model = None
+
+
+# 模型只在真的有新文字要嵌入時才載入
+def get_model():
+    global model
+    if model is None:
+        model = load_encoder(EMBED_BACKEND)
+    return model
 
-# 合併問題與答案
-faq_texts = [f"Q: {row['問題']} A: {row['答覆']}" for _, row in df.iterrows()]
 
 # 向量嵌入函式
 def embed(texts):
-    return model.encode(
+    return get_model().encode(
         [f"為這句話生成表示以用於檢索: {t}" for t in texts],
-        normalize_embeddings=True
+        normalize_embeddings=True,
+        batch_size=EMBED_BATCH_SIZE
     )
 
-# 產生向量嵌入
-faq_embeddings = embed(faq_texts)
-embedding_matrix = np.array(faq_embeddings).astype("float32")
 
-# 建立向量索引
-index = faiss.IndexFlatL2(embedding_matrix.shape[1])
-index.add(embedding_matrix)
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+# 讀取向量快取（模型不同就作廢）
+def load_embed_cache():
+    if not Path(EMBED_CACHE_PATH).exists():
+        return {}
+    data = np.load(EMBED_CACHE_PATH, allow_pickle=False)
+    if str(data["model"]) != MODEL_NAME:
+        return {}
+    return {h: v for h, v in zip(data["hashes"].tolist(), data["vectors"])}
+
+
+# 只保留目前仍在使用的文字，避免快取無限制成長
+def save_embed_cache(cache, hashes):
+    keep = list(dict.fromkeys(hashes))
+    vectors = np.stack([cache[h] for h in keep]).astype("float32")
+    np.savez(EMBED_CACHE_PATH, model=np.array(MODEL_NAME), hashes=np.array(keep), vectors=vectors)
+
+
+def load_previous_build():
+    old_texts = []
+    if Path(TEXTS_PATH).exists():
+        with open(TEXTS_PATH, "rb") as f:
+            old_texts = pickle.load(f)
+    index = faiss.read_index(INDEX_PATH) if Path(INDEX_PATH).exists() else None
+    # 沒有 sidecar 的是舊版 IndexFlatL2，沒有 ID 對應
+    meta = index_factory.load_meta(INDEX_PATH) if index_factory.meta_path(INDEX_PATH).exists() else None
+    return index, old_texts, meta
+
+
+# 舊版 faq.index 是沒有 ID 對應的 bge-large-zh IndexFlatL2，第一次執行時把向量搬進快取，不必重新嵌入
+def seed_cache_from_flat_index(cache, index, old_texts, meta):
+    if index is None or meta is not None or EMBED_BACKEND != "torch" or not isinstance(index, faiss.IndexFlat) or index.ntotal != len(old_texts):
+        return
+    vectors = index.reconstruct_n(0, index.ntotal)
+    for text, vector in zip(old_texts, vectors):
+        cache.setdefault(text_hash(text), vector)
+
+
+# kind 為 None 時沿用現有索引的類型（沒有 sidecar 則為 flat）
+# overrides 為命令列指定的索引參數；沒指定的部分用預設值補齊，完全沒指定則沿用現有索引的參數
+def build_index(kind=None, overrides=None, train_sample=50000):
+    # 讀取資料；沒有任何問答時不建索引，也不覆寫現有的 faq.index 等檔案
+    df = pd.read_csv(SOURCE_CSV)
+    if df.empty:
+        raise ValueError(f"{SOURCE_CSV} 沒有任何問答資料，無法建立索引（現有索引檔未變動）")
+
+    # 合併問題與答案
+    faq_texts = [f"Q: {row['問題']} A: {row['答覆']}" for _, row in df.iterrows()]
+    hashes = [text_hash(t) for t in faq_texts]
+
+    index, old_texts, meta = load_previous_build()
+    kind = kind or (meta["type"] if meta is not None else "flat")
+    old_hashes = previous_hashes = [text_hash(t) for t in old_texts]
+    cache = load_embed_cache()
+    seed_cache_from_flat_index(cache, index, old_texts, meta)
+
+    # 只嵌入快取裡沒有的文字，分批送進模型
+    texts_by_hash = dict(zip(hashes, faq_texts))
+    missing = [h for h in texts_by_hash if h not in cache]
+    for start in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch = missing[start:start + EMBED_BATCH_SIZE]
+        vectors = np.asarray(embed([texts_by_hash[h] for h in batch])).astype("float32")
+        cache.update(zip(batch, vectors))
+
+    params = None
+    if overrides:
+        params = index_factory.default_params(kind, len(hashes), len(cache[hashes[0]]))
+        params.update({k: v for k, v in overrides.items() if k in params})
+
+    # index 的 ID 就是 faq_data.csv 的列號
+    # 類型、參數或模型不同、ID 對不起來，或 HNSW 有資料要刪時整個重建（向量仍從快取取，不必重新嵌入）
+    unchanged = {i for i, h in enumerate(hashes) if i < len(old_hashes) and old_hashes[i] == h}
+    stale_ids = [i for i in range(len(old_hashes)) if i not in unchanged]
+    incremental = (
+        meta is not None
+        and meta["type"] == kind
+        and (params is None or meta["params"] == params)
+        and meta.get("model", "BAAI/bge-large-zh") == MODEL_NAME
+        and index.ntotal == len(old_hashes)
+        and (index_factory.supports_remove(kind) or not stale_ids)
+    )
+    if incremental:
+        params = meta["params"]
+        if stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        new_ids = [i for i in range(len(hashes)) if i not in unchanged]
+        if new_ids:
+            vectors = np.stack([cache[hashes[i]] for i in new_ids]).astype("float32")
+            index.add_with_ids(vectors, np.array(new_ids, dtype="int64"))
+    else:
+        unchanged = set()
+        vectors = np.stack([cache[h] for h in hashes]).astype("float32")
+        index, params = index_factory.build_index(kind, vectors, range(len(hashes)), params, train_sample)
+        print(f"重建 {kind} 索引，參數：{params}")
 
-# 儲存 FAISS index
-faiss.write_index(index, "faq.index")
+    # 儲存 FAISS index、FAQ 文字內容、原始資料與向量快取
+    index_factory.save_index(index, INDEX_PATH, {"type": kind, "params": params, "model": MODEL_NAME})
+    with open(TEXTS_PATH, "wb") as f:
+        pickle.dump(faq_texts, f)
+    df.to_csv(DATA_PATH, index=False)
+    write_store(df, STORE_DIR)
+    # BM25 不需嵌入，每次直接重建（斷詞方式：BM25_TOKENIZER=char / jieba）
+    BM25Index.build(faq_texts, os.getenv("BM25_TOKENIZER", "char")).save(BM25_PATH)
+    save_embed_cache(cache, hashes)
 
-# 儲存 FAQ 文字內容
-with open("faq_texts.pkl", "wb") as f:
-    pickle.dump(faq_texts, f)
+    missing_set, new_set = set(missing), set(hashes)
+    reused = sum(1 for h in hashes if h not in missing_set)
+    removed = sum(1 for h in previous_hashes if h not in new_set)
+    print(f"沿用 {reused} 筆（位置未變 {len(unchanged)} 筆）、新增嵌入 {len(missing)} 筆、移除 {removed} 筆")
+    print(f"已完成向量建立並儲存 {INDEX_PATH}、{TEXTS_PATH}、{DATA_PATH}、{STORE_DIR}/ 和 {BM25_PATH}（共 {index.ntotal} 筆）")
 
-# 儲存原始資料
-df.to_csv("faq_data.csv", index=False)
 
-print("已完成向量建立並儲存 faq.index、faq_texts.pkl 和 faq_data.csv")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="建立或增量更新 FAQ 向量索引")
+    parser.add_argument("--index-type", choices=index_factory.INDEX_TYPES, default=None,
+                        help="索引類型；預設沿用現有 faq.index 的類型，沒有則為 flat")
+    parser.add_argument("--nlist", type=int, help="IVF 分群數")
+    parser.add_argument("--pq-m", type=int, help="IVF-PQ 子向量數（需整除向量維度）")
+    parser.add_argument("--pq-nbits", type=int, help="IVF-PQ 每個子向量的位元數")
+    parser.add_argument("--hnsw-m", type=int, help="HNSW 每個節點的鄰居數")
+    parser.add_argument("--ef-construction", type=int, help="HNSW 建圖時的 efConstruction")
+    parser.add_argument("--train-sample", type=int, default=50000, help="IVF 訓練抽樣數")
+    args = parser.parse_args()
+    overrides = {
+        "nlist": args.nlist, "m": args.pq_m, "nbits": args.pq_nbits,
+        "M": args.hnsw_m, "efConstruction": args.ef_construction,
+    }
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    build_index(args.index_type, overrides, args.train_sample)
@@ -0,0 +1,223 @@
+# 輕量指標：各階段延遲直方圖、計數器與即時數值，提供 Prometheus 文字格式端點並定期寫入 feedback.db 的 metrics 表
+# metrics 表每列都是兩次寫入之間的區間值（直方圖與計數器皆為差值，即時數值為當下值），超過保留天數的列在寫入時刪除
+
+import datetime
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最後一格為 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+        self.count += 1
+
+
+# 由直方圖各桶的數量估計分位數（桶內線性內插）
+def estimate_quantile(buckets, counts, q):
+    total = sum(counts)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(list(buckets) + [buckets[-1]], counts):
+        if count and seen + count >= target:
+            return lower + (bound - lower) * (target - seen) / count
+        seen += count
+        lower = bound
+    return buckets[-1]
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (名稱, labels) -> Histogram
+        self.counters = {}  # (名稱, labels) -> 數值
+        self.gauges = {}  # 名稱 -> 回傳 {labels dict 的 tuple: 數值} 或單一數值的函式
+        self.flushed = {}  # 上次寫入資料庫時各直方圖與計數器的狀態，用來算區間差值
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.histograms.setdefault(key, Histogram()).observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    # 量測一段程式的耗時，記在 rag_stage_seconds{stage=...}
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("rag_stage_seconds", time.perf_counter() - start, stage=stage)
+
+    def render(self):
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            for (name, labels), h in sorted(self.histograms.items()):
+                declare(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {h.count}")
+                lines.append(f"{name}_sum{_label_text(labels)} {h.sum}")
+                lines.append(f"{name}_count{_label_text(labels)} {h.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                declare(name, "counter")
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        for name, fn in sorted(self.gauges.items()):
+            try:
+                values = fn()
+            except Exception:
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            declare(name, "gauge")
+            for labels, value in values.items():
+                lines.append(f"{name}{_label_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    # 自上次寫入後的新資料：每個直方圖一列（筆數、總和、估計 p50 / p95），有增加的計數器一列（增加量），即時數值各一列
+    def snapshot_rows(self):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        rows = []
+        with self.lock:
+            for key, h in self.histograms.items():
+                prev_counts, prev_sum, prev_count = self.flushed.get(key, ([0] * len(h.counts), 0.0, 0))
+                counts = [c - p for c, p in zip(h.counts, prev_counts)]
+                count = h.count - prev_count
+                if count:
+                    rows.append((now, key[0], json.dumps(dict(key[1]), ensure_ascii=False), count, h.sum - prev_sum,
+                                 estimate_quantile(h.buckets, counts, 0.5), estimate_quantile(h.buckets, counts, 0.95)))
+                self.flushed[key] = (list(h.counts), h.sum, h.count)
+            for key, value in self.counters.items():
+                delta = value - self.flushed.get(key, 0)
+                if delta:
+                    rows.append((now, key[0], json.dumps(dict(key[1]), ensure_ascii=False), None, delta, None, None))
+                self.flushed[key] = value
+        for name, fn in self.gauges.items():
+            try:
+                values = fn()
+            except Exception:
+                continue
+            if not isinstance(values, dict):
+                values = {(): values}
+            for labels, value in values.items():
+                rows.append((now, name, json.dumps(dict(labels), ensure_ascii=False), None, value, None, None))
+        return rows
+
+
+registry = Registry()
+
+
+def init_metrics_table(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS metrics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        time TEXT,
+        name TEXT,
+        labels TEXT,
+        count INTEGER,
+        value REAL,
+        p50 REAL,
+        p95 REAL
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_name_time ON metrics (name, time)")
+
+
+# retention_days 為 metrics 表保留的天數，None 或 0 表示不刪除
+def flush_to_db(db_path, reg=registry, retention_days=None):
+    rows = reg.snapshot_rows()
+    if not rows:
+        return
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with conn:
+            init_metrics_table(conn)
+            conn.executemany(
+                "INSERT INTO metrics (time, name, labels, count, value, p50, p95) VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            if retention_days:
+                cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+                conn.execute("DELETE FROM metrics WHERE time < ?", (cutoff.isoformat(timespec="seconds"),))
+    finally:
+        conn.close()
+
+
+# 背景執行緒：每 interval 秒把指標寫進資料庫
+def start_db_writer(db_path, interval=60, reg=registry, retention_days=None):
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                flush_to_db(db_path, reg, retention_days)
+            except Exception:
+                logger.exception("寫入 metrics 表失敗")
+
+    thread = threading.Thread(target=run, name="metrics-writer", daemon=True)
+    thread.start()
+    return thread
+
+
+# Prometheus 抓取端點：GET /metrics；預設只聽本機，要讓其他主機抓取時才把 host 設成 0.0.0.0
+def start_http_server(port, host="127.0.0.1", reg=registry):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = reg.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,248 @@
+# 問答流程用到的快取：查詢向量快取（記憶體 LRU + 選用的 SQLite 磁碟層）、LLM 改寫答案快取
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# 問題正規化：全半形統一、去除多餘空白與句尾標點，讓「罰單怎麼繳？」和「罰單怎麼繳」共用同一筆快取
+def normalize_question(text):
+    text = unicodedata.normalize("NFKC", str(text))
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text.rstrip("?？!！。.~～ ")
+
+
+class QueryEmbeddingCache:
+    """查詢向量快取，記憶體層用 LRU 淘汰；指定 db_path 時另有重啟後仍保留的 SQLite 磁碟層。
+
+    model 為嵌入後端識別（embedding_backend.backend_id）；磁碟層記錄建立時的 model，
+    換後端後第一次開啟就清空，不會把舊後端的向量拿去查新後端建的索引。
+    """
+
+    def __init__(self, max_size=1024, db_path=None, max_disk_size=50000, model=None):
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS query_embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB,
+                last_used REAL
+            )""")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value TEXT)")
+            row = self.conn.execute("SELECT value FROM cache_meta WHERE name = 'model'").fetchone()
+            if (row[0] if row else None) != model:
+                cleared = self.conn.execute("DELETE FROM query_embeddings").rowcount
+                self.conn.execute("INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('model', ?)", (model,))
+                if cleared:
+                    logger.info("嵌入後端已改為 %s，清除 %d 筆舊的查詢向量快取", model, cleared)
+            self.conn.commit()
+
+    def get(self, text):
+        key = normalize_question(text)
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype="float32")
+                    self.conn.execute(
+                        "UPDATE query_embeddings SET last_used = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self.conn.commit()
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, text, vector):
+        key = normalize_question(text)
+        vector = np.asarray(vector, dtype="float32").ravel()
+        with self.lock:
+            self._remember(key, vector)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO query_embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time())
+                )
+                self._prune_disk()
+                self.conn.commit()
+
+    # 快取未命中時才呼叫 compute（以正規化後的文字計算向量，確保同 key 結果一致）
+    def get_or_compute(self, text, compute):
+        vector = self.get(text)
+        if vector is None:
+            vector = np.asarray(compute(normalize_question(text)), dtype="float32").ravel()
+            self.put(text, vector)
+        return vector
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self.memory),
+                "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+            }
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def _prune_disk(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+        if count > self.max_disk_size:
+            self.conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                "SELECT key FROM query_embeddings ORDER BY last_used LIMIT ?)",
+                (count - self.max_disk_size,)
+            )
+
+
+class AnswerCache:
+    """rephrase_answer 的結果快取，key 為 (FAQ 列號, 對話背景, 正規化問題)。
+
+    mode 為 "off" 時不快取；"exact" 只接受正規化後完全相同的問題；
+    "semantic" 另外接受同列號、同背景下查詢向量 cosine 相似度達 threshold 的問題。
+    query_vector 可為 None（呼叫端沒有查詢向量時），此時只做完全比對。
+    """
+
+    def __init__(self, mode="semantic", threshold=0.95, ttl=86400, max_size=2048):
+        self.mode = mode
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> (查詢向量, 改寫結果, 建立時間)
+        self.groups = {}  # (列號, 背景) -> 該組底下的 key
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def lookup(self, row_id, question, context, query_vector):
+        if self.mode == "off":
+            return None
+        group = (row_id, normalize_question(context))
+        key = group + (normalize_question(question),)
+        with self.lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                self.exact_hits += 1
+                return self._hit("exact", row_id, key, entry)
+            if self.mode == "semantic" and query_vector is not None:
+                query_vector = np.asarray(query_vector, dtype="float32").ravel()
+                best_key, best_score = None, self.threshold
+                for candidate in list(self.groups.get(group, ())):
+                    entry = self._fresh(candidate)
+                    if entry is None or entry[0] is None:
+                        continue
+                    score = float(np.dot(entry[0], query_vector))  # 向量皆已正規化，內積即 cosine
+                    if score >= best_score:
+                        best_key, best_score = candidate, score
+                if best_key is not None:
+                    self.semantic_hits += 1
+                    return self._hit("semantic", row_id, best_key, self.entries[best_key])
+            self.misses += 1
+            return None
+
+    def store(self, row_id, question, context, query_vector, answer):
+        if self.mode == "off" or not answer:
+            return
+        group = (row_id, normalize_question(context))
+        key = group + (normalize_question(question),)
+        vector = None if query_vector is None else np.asarray(query_vector, dtype="float32").ravel()
+        with self.lock:
+            self.entries[key] = (vector, answer, time.time())
+            self.entries.move_to_end(key)
+            self.groups.setdefault(group, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self._drop(next(iter(self.entries)))
+
+    def stats(self):
+        with self.lock:
+            saved = self.exact_hits + self.semantic_hits
+            total = saved + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "llm_calls_saved": saved,
+                "hit_rate": saved / total if total else 0.0,
+                "size": len(self.entries),
+            }
+
+    def _fresh(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[2] > self.ttl:
+            self._drop(key)
+            return None
+        return entry
+
+    def _hit(self, kind, row_id, key, entry):
+        self.entries.move_to_end(key)
+        logger.info(
+            "答案快取命中（%s）FAQ 列 %s，累計省下 %d 次 LLM 呼叫",
+            kind, row_id, self.exact_hits + self.semantic_hits
+        )
+        return entry[1]
+
+    def _drop(self, key):
+        self.entries.pop(key, None)
+        group = self.groups.get(key[:2])
+        if group is not None:
+            group.discard(key)
+            if not group:
+                del self.groups[key[:2]]
+
+
+# 換後端檢查：python rag_cache.py（在暫存目錄建立磁碟快取，不動 query_cache.db）
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from embedding_backend import backend_id
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "query_cache.db")
+        cache = QueryEmbeddingCache(db_path=path, model=backend_id("torch"))
+        cache.put("罰單怎麼繳？", np.ones(1024, dtype="float32"))
+        if QueryEmbeddingCache(db_path=path, model=backend_id("torch")).get("罰單怎麼繳") is None:
+            failures += 1
+            print("✗ 同一後端重新開啟後應沿用磁碟快取")
+        for backend in ["small", "onnx-int8", "torch"]:
+            switched = QueryEmbeddingCache(db_path=path, model=backend_id(backend))
+            if switched.get("罰單怎麼繳") is not None:
+                failures += 1
+                print(f"✗ 換成 {backend} 後不應回傳前一個後端的向量")
+            switched.put("罰單怎麼繳", np.full(512 if backend == "small" else 1024, len(backend), dtype="float32"))
+            vector = QueryEmbeddingCache(db_path=path, model=backend_id(backend)).get("罰單怎麼繳")
+            if vector is None or vector[0] != len(backend):
+                failures += 1
+                print(f"✗ 換成 {backend} 後寫入的向量應可沿用")
+    print("查詢向量快取換後端檢查：" + ("通過" if not failures else f"{failures} 項失敗"))
+    raise SystemExit(1 if failures else 0)
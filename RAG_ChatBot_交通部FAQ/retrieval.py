@@ -0,0 +1,172 @@
+# 檢索階段：FAISS（加上選用的 BM25）取前 k 筆候選 → 重新排序（cross-encoder、RRF 或字元 bigram 詞面分數融合）→ 信心門檻
+
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class Candidate:
+    row_id: int
+    distance: float  # FAISS 回傳的 L2 距離平方
+    similarity: float  # 由距離換算的 cosine 相似度
+    score: float  # 重新排序後的分數
+    fast_path: bool = False  # 由詞面快速路徑直接決定，沒有經過融合與重新排序
+
+
+def char_ngrams(text, n=2):
+    text = re.sub(r"[\W_]+", "", str(text).lower())
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# 詞面分數：問題中的字元 bigram 有多少比例出現在 FAQ 問題裡
+def lexical_score(query, document):
+    query_grams = char_ngrams(query)
+    if not query_grams:
+        return 0.0
+    return len(query_grams & char_ngrams(document)) / len(query_grams)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    fused = {}
+    for ranking in rankings:
+        for rank, row_id in enumerate(ranking):
+            fused[row_id] = fused.get(row_id, 0.0) + 1 / (k + rank + 1)
+    return fused
+
+
+class Retriever:
+    """取回候選 FAQ 並判斷是否有足夠信心回答。
+
+    question_of(row_id) 回傳該列的 FAQ 問題文字，供詞面分數或 cross-encoder 使用。
+    距離大於 max_distance 的候選會被捨棄；全部被捨棄時回傳空串列，由呼叫端直接回覆客服專線，不呼叫 LLM。
+    有 lexical_index（BM25Index）時，BM25 的前 k 筆與 FAISS 的前 k 筆以 RRF 融合排序，
+    查詢詞覆蓋率達 lexical_min_coverage 的 BM25 候選即使向量距離較遠也會保留。
+    """
+
+    def __init__(self, index, question_of, top_k=5, max_distance=0.6, lexical_weight=0.3, reranker=None,
+                 lexical_index=None, lexical_min_coverage=0.6, fast_path_coverage=0.9, fast_path_margin=2.0,
+                 fast_path_min_terms=3):
+        self.index = index
+        self.question_of = question_of
+        self.top_k = top_k
+        self.max_distance = max_distance
+        self.lexical_weight = lexical_weight
+        self.reranker = reranker
+        self.lexical_index = lexical_index
+        self.lexical_min_coverage = lexical_min_coverage
+        self.fast_path_coverage = fast_path_coverage
+        self.fast_path_margin = fast_path_margin
+        self.fast_path_min_terms = fast_path_min_terms
+
+    # 「詞面完全命中」快速路徑：BM25 第一名幾乎涵蓋所有查詢詞、至少命中 fast_path_min_terms 個詞，
+    # 且分數遠高於第二名時，不必融合排序或跑 cross-encoder。只有一筆命中代表查詢太短或太特殊，不算有把握。
+    # hits 為已算好的 BM25 結果（至少前兩名）；回傳的候選還沒有向量距離，retrieve 會再檢查距離門檻
+    def lexical_fast_path(self, query, hits=None):
+        if self.lexical_index is None or not self.fast_path_coverage:
+            return []
+        if hits is None:
+            hits = self.lexical_index.search(query, 2)
+        if len(hits) < 2 or hits[0][2] < self.fast_path_coverage:
+            return []
+        if hits[0][1] < self.fast_path_margin * hits[1][1]:
+            return []
+        if self.lexical_index.matched_terms(query, hits[0][0]) < self.fast_path_min_terms:
+            return []
+        return [Candidate(hits[0][0], float("inf"), 0.0, hits[0][1])]
+
+    def retrieve(self, query, query_vector):
+        query_vector = np.asarray(query_vector, dtype="float32").reshape(1, -1)
+        D, I = self.index.search(query_vector, self.top_k)
+        dense = {
+            int(row_id): Candidate(int(row_id), float(distance), 1 - float(distance) / 2, 0.0)
+            for distance, row_id in zip(D[0], I[0]) if row_id >= 0
+        }
+        candidates = [c for c in dense.values() if c.distance <= self.max_distance]
+
+        fused = None
+        if self.lexical_index is not None:
+            # FAISS 與 BM25 各查一次，快速路徑與完整排序共用結果
+            hits = self.lexical_index.search(query, max(self.top_k, 2))
+            # 快速路徑：詞面命中的那筆也在向量前 k 筆內且距離合格時直接回傳，不做融合與重新排序
+            for lexical in self.lexical_fast_path(query, hits):
+                match = dense.get(lexical.row_id)
+                if match is not None and match.distance <= self.max_distance:
+                    return [Candidate(match.row_id, match.distance, match.similarity, lexical.score, fast_path=True)]
+            kept = {c.row_id for c in candidates}
+            for row_id, _, coverage in hits:
+                if row_id not in kept and coverage >= self.lexical_min_coverage:
+                    candidates.append(dense.get(row_id) or Candidate(row_id, float("inf"), 0.0, 0.0))
+                    kept.add(row_id)
+            fused = reciprocal_rank_fusion([list(dense), [row_id for row_id, _, _ in hits]])
+        if not candidates:
+            return []
+
+        questions = [self.question_of(c.row_id) for c in candidates]
+        if self.reranker is not None:
+            scores = self.reranker.predict([(query, q) for q in questions])
+        elif fused is not None:
+            scores = [fused.get(c.row_id, 0.0) for c in candidates]
+        else:
+            w = self.lexical_weight
+            scores = [(1 - w) * c.similarity + w * lexical_score(query, q) for c, q in zip(candidates, questions)]
+        for candidate, score in zip(candidates, scores):
+            candidate.score = float(score)
+        return sorted(candidates, key=lambda c: c.score, reverse=True)
+
+
+# 選用的 cross-encoder 重新排序模型（例如 BAAI/bge-reranker-base），未設定時使用詞面分數融合
+def load_reranker(model_name):
+    if not model_name:
+        return None
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name)
+
+
+# 快速路徑回歸檢查：python retrieval.py（使用 main.py 產生的 faq_bm25.npz 與 faq_data.csv）
+# 單詞查詢即使剛好完全命中某筆 FAQ 也不可走快速路徑；完整的 FAQ 問題則應該走，且每次檢索只查一次向量索引
+if __name__ == "__main__":
+    import pandas as pd
+    from bm25_index import BM25Index
+
+    questions = pd.read_csv("faq_data.csv")["問題"].tolist()
+    retriever = Retriever(None, questions.__getitem__, lexical_index=BM25Index.load("faq_bm25.npz"))
+    failures = 0
+    for query in ["高鐵?", "機車", "停車", "駕照", "ETC"]:
+        if retriever.lexical_fast_path(query):
+            failures += 1
+            print(f"✗ 單詞查詢「{query}」不應走快速路徑")
+    for row_id, question in enumerate(questions):
+        found = retriever.lexical_fast_path(question)
+        if found and found[0].row_id != row_id:
+            failures += 1
+            print(f"✗ 「{question}」走快速路徑卻指向第 {found[0].row_id} 筆")
+
+    # retrieve 每次查詢只呼叫一次 index.search：快速路徑確認距離與完整排序共用同一份結果
+    class CountingIndex:
+        def __init__(self):
+            self.calls = 0
+
+        def search(self, query_vector, k):
+            self.calls += 1
+            row_id = int(query_vector[0, 0])
+            return np.array([[0.1] + [0.5] * (k - 1)]), np.array([[row_id] + [(row_id + i) % len(questions)
+                                                                            for i in range(1, k)]])
+
+    retriever.index = CountingIndex()
+    for row_id, question in enumerate(questions):
+        found = retriever.retrieve(question, [row_id])
+        if not found or found[0].row_id != row_id:
+            failures += 1
+            print(f"✗ 「{question}」檢索結果應為第 {row_id} 筆")
+        elif found[0].fast_path != bool(retriever.lexical_fast_path(question)):
+            failures += 1
+            print(f"✗ 「{question}」快速路徑判斷與 lexical_fast_path 不一致")
+    if retriever.index.calls != len(questions):
+        failures += 1
+        print(f"✗ {len(questions)} 次檢索呼叫了 {retriever.index.calls} 次 index.search")
+    print("快速路徑回歸檢查：" + ("通過" if not failures else f"{failures} 項失敗"))
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,49 @@
+# 冷啟動報告：分別在子行程中匯入 app.py，比較啟動時間、常駐記憶體與第一次查詢延遲
+# 用法：python startup_report.py
+# 「before」為整份載入索引並在啟動時載入模型，「after」為 mmap 索引並延後載入模型
+
+import json
+import os
+import subprocess
+import sys
+
+CONFIGS = {
+    "before（INDEX_MMAP=0, MODEL_WARMUP=eager）": {"INDEX_MMAP": "0", "MODEL_WARMUP": "eager"},
+    "after（INDEX_MMAP=1, MODEL_WARMUP=lazy）": {"INDEX_MMAP": "1", "MODEL_WARMUP": "lazy"},
+    "after（INDEX_MMAP=1, MODEL_WARMUP=background）": {"INDEX_MMAP": "1", "MODEL_WARMUP": "background"},
+}
+
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import app
+ready = time.perf_counter() - start
+ready_rss = app.current_rss_mb()
+query_start = time.perf_counter()
+
+async def first_query():
+    async for _ in app.answer_question("罰單怎麼繳", []):
+        pass
+
+asyncio.run(first_query())
+print(json.dumps({
+    "startup_s": ready,
+    "startup_rss_mb": ready_rss,
+    "first_query_s": time.perf_counter() - query_start,
+    "after_query_rss_mb": app.current_rss_mb(),
+}))
+"""
+
+
+def run(env_overrides):
+    env = dict(os.environ, LLM_BACKEND="fake", QUERY_CACHE_DB="", ANSWER_CACHE_MODE="off", **env_overrides)
+    result = subprocess.run([sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    print(f"{'設定':<48}{'啟動秒數':>10}{'啟動 RSS':>12}{'首次查詢秒數':>14}{'查詢後 RSS':>12}")
+    for name, overrides in CONFIGS.items():
+        r = run(overrides)
+        print(f"{name:<48}{r['startup_s']:>10.2f}{r['startup_rss_mb']:>12.0f}"
+              f"{r['first_query_s']:>14.2f}{r['after_query_rss_mb']:>12.0f}")